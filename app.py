@@ -3,29 +3,58 @@
 #----------------------------------------------------------------------------#
 
 import json
+import functools
+import hashlib
+import click
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context, jsonify
 from flask_moment import Moment
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from models import *
+from queries import *
+from cache import TTLCache, make_page_cache
+from importer import import_file
+from exporter import export_stream
+from assets import Assets, build_assets
+from counters import rebuild_show_counts, roll_show_counts
+from areas import rebuild_areas
+from instrumentation import (RouteMetrics, SQLProfiler, TimedQueuePool,
+                             init_logging, pool_monitor, template_stats,
+                             timed_environment, warm_templates)
 import config
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
 app = Flask(__name__)
+app.jinja_environment = timed_environment(app.jinja_environment)
+if config.TEMPLATE_BYTECODE_CACHE_DIR:
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(
+        config.TEMPLATE_BYTECODE_CACHE_DIR))
 moment = Moment(app)
 app.config.from_object('config')
 app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'])
+if app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] = TimedQueuePool
+pool_monitor.slow_checkout_ms = config.DB_POOL_SLOW_CHECKOUT_MS
 db.init_app(app)
 migrate = Migrate(app, db)
+sql_profiler = SQLProfiler(app)
+route_metrics = RouteMetrics(app)
+search_cache = TTLCache(app.config['SEARCH_CACHE_TTL'],
+                        app.config['SEARCH_CACHE_SIZE'])
+page_cache = make_page_cache(app.config)
+assets = Assets(app)
 
 
 #----------------------------------------------------------------------------#
@@ -33,17 +62,65 @@ migrate = Migrate(app, db)
 #----------------------------------------------------------------------------#
 
 
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format, locale='en'):
+    # compiled babel pattern and locale, parsed once per format/locale
+    return babel.dates.parse_pattern(format), babel.Locale.parse(locale)
+
+
+@functools.lru_cache(maxsize=4096)
+def render_datetime(value, format, locale='en'):
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    # views pass datetime objects; strings are still parsed for older callers
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return render_datetime(value, DATETIME_FORMATS.get(format, format))
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+
+def stream_template(template_name, **context):
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(5)
+    return stream
+
+
+if app.config['TEMPLATE_WARMUP']:
+    warm_templates(app.jinja_env)
+
+#----------------------------------------------------------------------------#
+# Page cache invalidation.
+#----------------------------------------------------------------------------#
+
+
+def venue_cache_keys(venue_id):
+    # the venue page, the venue directory and every artist page listing one
+    # of its shows
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct()
+    return [('venue', venue_id), ('venues', 'directory')] + [
+        ('artist', i) for (i,) in artist_ids]
+
+
+def artist_cache_keys(artist_id):
+    # the artist page plus every venue page listing one of its shows
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct()
+    return [('artist', artist_id)] + [('venue', i) for (i,) in venue_ids]
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -80,6 +157,7 @@ def create_venue_submission():
             address=venue_form.address.data,
             phone=venue_form.phone.data,
             genres=','.join(venue_form.genres.data),
+            genre_tags=Genre.for_names(venue_form.genres.data),
             facebook_link=venue_form.facebook_link.data,
             image_link=venue_form.image_link.data,
             website_link=venue_form.website_link.data,
@@ -88,6 +166,7 @@ def create_venue_submission():
         )
         db.session.add(new_venue)
         db.session.commit()
+        page_cache.invalidate(('venues', 'directory'))
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except ():
@@ -105,105 +184,76 @@ def create_venue_submission():
 #  Venues (READ)
 #  ----------------------------------------------------------------
 
+def directory_data(genre=None, state=None):
+    # read from the materialised venue areas, unless filtered by genre,
+    # which only the live venue_directory query can do. genre and state
+    # narrow the listing; only the full one is cached.
+    data = None
+    if not (genre or state):
+        data = page_cache.get('venues', 'directory')
+    if data is None:
+        data = []
+        try:
+            now = datetime.now()
+            if genre:
+                data, boundary = venue_directory(now, genre=genre, state=state)
+            else:
+                data, boundary = area_directory(now, state=state)
+            if not (genre or state or db.router.may_be_stale()):
+                page_cache.set_until('venues', 'directory', data, boundary,
+                                     ttl=db.router.cache_ttl())
+        except ():
+            db.session.rollback()
+        finally:
+            db.session.close()
+    return data
+
+
 @app.route('/venues')
 def venues():
-    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-    venues = Venue.query.distinct(Venue.city, Venue.state).all()
-    data = []
-    try:
-        for venue in venues:
-            venue_data = {
-                "city": venue.city,
-                "state": venue.state,
-                "venues": []
-            }
-            city_venues = Venue.query.filter_by(city=venue.city).all()
-            for i in city_venues:
-                upcoming_shows_query = db.session.query(Show, Venue).join(
-                    Venue).filter(Show.venue_id == i.id).filter(Show.date > datetime.now()).all()
-                if venue_data["city"] == i.city:
-                    venue_data["venues"].append({
-                        "id": i.id,
-                        "name": i.name,
-                        "num_upcoming_shows": len(upcoming_shows_query),
-                    })
-            data.append(venue_data)
-    except ():
-        db.session.rollback()
-    finally:
-        db.session.close()
+    data = directory_data(genre=request.args.get('genre'),
+                          state=request.args.get('state'))
     return render_template('pages/venues.html', areas=data)
 
 
+DETAILS = {'venue': venue_detail, 'artist': artist_detail}
+
+
+def detail_data(kind, id):
+    # venue/artist page data through the page cache, or None if unknown
+    data = page_cache.get(kind, id)
+    if data is None:
+        try:
+            now = datetime.now()
+            data = DETAILS[kind](id, now)
+            if data is not None and not db.router.may_be_stale():
+                page_cache.set_until(kind, id, data, next_boundary(data),
+                                     ttl=db.router.cache_ttl())
+        except ():
+            db.session.rollback()
+        finally:
+            db.session.close()
+    return data
+
+
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-    try:
-        data = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": venue.genres.split(','),
-            "address": venue.address,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "website": venue.website_link,
-            "facebook_link": venue.facebook_link,
-            "seeking_talent": venue.searching_talent,
-            "seeking_description": venue.search_description,
-            "image_link": venue.image_link,
-            "past_shows": [],
-            "upcoming_shows": [],
-        }
-        past_shows_query = db.session.query(Show, Venue, Artist).join(
-            Venue).join(Artist).filter(Show.venue_id == venue_id).filter(Show.date < datetime.now()).all()
-        for show in past_shows_query:
-            data['past_shows'].append({
-                "artist_id": show.Artist.id,
-                "artist_name": show.Artist.name,
-                "artist_image_link": show.Artist.image_link,
-                "start_time": show.Show.date.strftime('%Y-%m-%d %H:%I')
-            })
-
-        upcoming_shows_query = db.session.query(Show, Venue, Artist).join(
-            Venue).join(Artist).filter(Show.venue_id == venue_id).filter(Show.date > datetime.now()).all()
-        for show in upcoming_shows_query:
-            data['upcoming_shows'].append({
-                "artist_id": show.Artist.id,
-                "artist_name": show.Artist.name,
-                "artist_image_link": show.Artist.image_link,
-                "start_time": show.Show.date.strftime('%Y-%m-%d %H:%I')
-            })
-        data["past_shows_count"] = len(data['past_shows'])
-        data["upcoming_shows_count"] = len(data['upcoming_shows'])
-    except ():
-        db.session.rollback()
-    finally:
-        db.session.close()
+    data = detail_data('venue', venue_id)
+    if data is None:
+        abort(404)
     return render_template('pages/show_venue.html', venue=data)
 
 
 @app.route('/venues/search', methods=['POST'])
+@db.router.read_only
 def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    search_term = request.form.get('search_term')
-    term = "%{}%".format(search_term.replace(" ", "\ "))
+    search_term = request.form.get('search_term', '')
+    response = {"count": 0, "data": []}
     try:
-        search = Venue.query.filter(Venue.name.match(term)).all()
-        result = []
-        for i in search:
-            data = {
-                "id": i.id,
-                "name": i.name,
-                "num_upcoming_shows": len(i.shows)
-            }
-            result.append(data)
-        response = {
-            "count": len(result),
-            "data": result
-        }
+        response = search(Venue, search_term, limit=app.config['SEARCH_LIMIT'])
     except ():
         db.session.rollback()
     finally:
@@ -223,7 +273,7 @@ def edit_venue(venue_id):
         form.city.data = venue.city
         form.state.data = venue.state
         form.phone.data = venue.phone
-        form.genres.data = venue.genres
+        form.genres.data = [genre.name for genre in venue.genre_tags]
         form.address.data = venue.address
         form.facebook_link.data = venue.facebook_link
         form.image_link.data = venue.image_link
@@ -250,12 +300,15 @@ def edit_venue_submission(venue_id):
         venue.state = venue_form.state.data
         venue.phone = venue_form.phone.data
         venue.genres = ','.join(venue_form.genres.data)
+        venue.genre_tags = Genre.for_names(venue_form.genres.data)
         venue.facebook_link = venue_form.facebook_link.data
         venue.image_link = venue_form.image_link.data
         venue.website_link = venue_form.website_link.data
         venue.searching_talent = venue_form.seeking_talent.data
         venue.search_description = venue_form.seeking_description.data
+        cache_keys = venue_cache_keys(venue_id)
         db.session.commit()
+        page_cache.invalidate(*cache_keys)
     except ():
         error = True
         db.session.rollback()
@@ -273,8 +326,10 @@ def delete_venue(venue_id):
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
     try:
         venue = Venue.query.get(venue_id)
+        cache_keys = venue_cache_keys(venue.id)
         db.session.delete(venue)
         db.session.commit()
+        page_cache.invalidate(*cache_keys)
         flash('Venue ' + venue.name + ' was successfully deleted!')
     except ():
         db.session.rollback()
@@ -311,6 +366,7 @@ def create_artist_submission():
             state=artist_form.state.data,
             phone=artist_form.phone.data,
             genres=','.join(artist_form.genres.data),
+            genre_tags=Genre.for_names(artist_form.genres.data),
             facebook_link=artist_form.facebook_link.data,
             image_link=artist_form.image_link.data,
             website_link=artist_form.website_link.data,
@@ -339,8 +395,11 @@ def create_artist_submission():
 
 @app.route('/artists')
 def artists():
+    # ?genre= and ?state= narrow the listing
+    data = []
     try:
-        data = Artist.query.order_by('name').all()
+        data = artist_listing(genre=request.args.get('genre'),
+                              state=request.args.get('state'))
     except ():
         db.session.rollback()
     finally:
@@ -351,71 +410,21 @@ def artists():
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    artist = Artist.query.get(artist_id)
-    try:
-        data = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": artist.genres.split(','),
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "website": artist.website_link,
-            "facebook_link": artist.facebook_link,
-            "seeking_venues": artist.searching_venues,
-            "seeking_description": artist.search_description,
-            "image_link": artist.image_link,
-            "past_shows": [],
-            "upcoming_shows": [],
-        }
-        past_shows_query = db.session.query(Show, Venue, Artist).join(
-            Venue).join(Artist).filter(Show.artist_id == artist_id).filter(Show.date < datetime.now()).all()
-        for show in past_shows_query:
-            data['past_shows'].append({
-                "venue_id": show.Venue.id,
-                "venue_name": show.Venue.name,
-                "venue_image_link": show.Venue.image_link,
-                "start_time": show.Show.date.strftime('%Y-%m-%d %H:%I')
-            })
-
-        upcoming_shows_query = db.session.query(Show, Venue, Artist).join(
-            Venue).join(Artist).filter(Show.artist_id == artist_id).filter(Show.date > datetime.now()).all()
-        for show in upcoming_shows_query:
-            data['upcoming_shows'].append({
-                "venue_id": show.Venue.id,
-                "venue_name": show.Venue.name,
-                "venue_image_link": show.Venue.image_link,
-                "start_time": show.Show.date.strftime('%Y-%m-%d %H:%I')
-            })
-        data["past_shows_count"] = len(data['past_shows'])
-        data["upcoming_shows_count"] = len(data['upcoming_shows'])
-    except ():
-        db.session.rollback()
-    finally:
-        db.session.close()
+    data = detail_data('artist', artist_id)
+    if data is None:
+        abort(404)
     return render_template('pages/show_artist.html', artist=data)
 
 
 @app.route('/artists/search', methods=['POST'])
+@db.router.read_only
 def search_artists():
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    search_term = request.form.get('search_term')
-    term = "%{}%".format(search_term.replace(" ", "\ "))
+    search_term = request.form.get('search_term', '')
+    response = {"count": 0, "data": []}
     try:
-        search = Artist.query.filter(Artist.name.match(term)).all()
-        result = []
-        for i in search:
-            data = {
-                "id": i.id,
-                "name": i.name,
-                "num_upcoming_shows": len(i.shows)
-            }
-            result.append(data)
-        response = {
-            "count": len(result),
-            "data": result
-        }
+        response = search(Artist, search_term, limit=app.config['SEARCH_LIMIT'])
     except ():
         db.session.rollback()
     finally:
@@ -437,7 +446,7 @@ def edit_artist(artist_id):
         form.city.data = artist.city
         form.state.data = artist.state
         form.phone.data = artist.phone
-        form.genres.data = artist.genres
+        form.genres.data = [genre.name for genre in artist.genre_tags]
         form.facebook_link.data = artist.facebook_link
         form.image_link.data = artist.image_link
         form.website_link.data = artist.website_link
@@ -462,12 +471,15 @@ def edit_artist_submission(artist_id):
         artist.state = artist_form.state.data
         artist.phone = artist_form.phone.data
         artist.genres = ','.join(artist_form.genres.data)
+        artist.genre_tags = Genre.for_names(artist_form.genres.data)
         artist.facebook_link = artist_form.facebook_link.data
         artist.image_link = artist_form.image_link.data
         artist.website_link = artist_form.website_link.data
         artist.searching_venues = artist_form.seeking_venue.data
         artist.search_description = artist_form.seeking_description.data
+        cache_keys = artist_cache_keys(artist_id)
         db.session.commit()
+        page_cache.invalidate(*cache_keys)
     except ():
         error = True
         db.session.rollback()
@@ -484,8 +496,10 @@ def edit_artist_submission(artist_id):
 def delete_artist(artist_id):
     try:
         artist = Artist.query.get(artist_id)
+        cache_keys = artist_cache_keys(artist.id)
         db.session.delete(artist)
         db.session.commit()
+        page_cache.invalidate(*cache_keys)
         # on successful db update, flash success
         flash('Artist ' + artist.name + ' was successfully deleted')
     except ():
@@ -524,6 +538,9 @@ def create_show_submission():
         )
         db.session.add(new_show)
         db.session.commit()
+        page_cache.invalidate(('venue', int(new_show.venue_id)),
+                              ('artist', int(new_show.artist_id)),
+                              ('venues', 'directory'))
         # on successful db insert, flash success
         flash('Show was successfully listed!')
     except ():
@@ -538,28 +555,343 @@ def create_show_submission():
 #  Shows (READ)
 #  ----------------------------------------------------------------
 
+def shows_page_data():
+    # the keyset page selected by ?after=, ?per_page= and ?scope=
+    per_page = min(request.args.get('per_page', app.config['SHOWS_PER_PAGE'], type=int),
+                   app.config['SHOWS_MAX_PER_PAGE'])
+    scope = request.args.get('scope', 'upcoming')
+    after = None
+    if request.args.get('after'):
+        try:
+            after = parse_show_cursor(request.args['after'])
+        except ValueError:
+            abort(400)
+    rows = []
+    next_after = None
+    try:
+        rows, next_after = show_page(
+            after=after, limit=max(per_page, 1), upcoming_only=scope != 'all')
+    except ():
+        db.session.rollback()
+    finally:
+        db.session.close()
+    return rows, next_after, per_page, scope
+
+
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
-    show_list = db.session.query(
-        Show, Artist, Venue).join(Artist).join(Venue).all()
+    # displays a keyset page of shows at /shows, upcoming only unless
+    # ?scope=all, streaming the tiles as they render.
+    rows, next_after, per_page, scope = shows_page_data()
+    next_url = None
+    if next_after is not None:
+        next_url = url_for('shows', after=format_show_cursor(next_after),
+                           per_page=per_page, scope=scope)
+
+    data = ({
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+        "start_time": row.start_time
+    } for row in rows)
+    return Response(stream_with_context(
+        stream_template('pages/shows.html', shows=data, next_url=next_url)))
+
+
+#  Search API
+#  ----------------------------------------------------------------
+
+SEARCH_MODELS = {'venue': Venue, 'artist': Artist}
+
+
+def search_rank(key, row):
+    # exact matches first, then names starting with the term, then the rest,
+    # each by name: one order whichever prefix the rows were cached under
+    name = row['name'].lower()
+    return (name != key, not name.startswith(key), name)
+
+
+def prefix_search(kind, term):
+    # a name containing the term also contains every prefix of it, so a
+    # cached, untruncated result for a shorter prefix is filtered in Python
+    # instead of querying again; either way the rows are ranked for the
+    # term. Clients inside their sticky window skip the cache, which may
+    # predate their write; results that may come from a lagging replica are
+    # not cached, and other replica results only for the sticky window.
+    key = term.lower()
+    if not db.router.sticky():
+        for end in range(len(key), 0, -1):
+            cached = search_cache.get((kind, key[:end]))
+            if cached is not None and (end == len(key) or cached['complete']):
+                return sorted((row for row in cached['data'] if key in row['name'].lower()),
+                              key=lambda row: search_rank(key, row))
+    limit = app.config['SEARCH_LIMIT']
+    data = search(SEARCH_MODELS[kind], term, limit=limit)['data']
+    if not db.router.may_be_stale():
+        search_cache.set((kind, key), {'data': data, 'complete': len(data) < limit},
+                         db.router.cache_ttl(search_cache.ttl))
+    return sorted(data, key=lambda row: search_rank(key, row))
+
+
+@app.route('/api/search')
+def api_search():
+    # lightweight search-as-you-type lookup returning compact JSON
+    term = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'venue')
+    limit = request.args.get('limit', 10, type=int)
+    if kind not in SEARCH_MODELS:
+        abort(400)
     data = []
     try:
-        for showw in show_list:
-            details = {
-                "venue_id": showw.Venue.id,
-                "venue_name": showw.Venue.name,
-                "artist_id": showw.Artist.id,
-                "artist_name": showw.Artist.name,
-                "artist_image_link": showw.Artist.image_link,
-                "start_time": showw.Show.date.strftime('%Y-%m-%d %H:%I')
-            }
-            data.append(details)
+        if term:
+            data = prefix_search(kind, term)[:max(limit, 0)]
+    except ():
+        db.session.rollback()
+    finally:
+        db.session.close()
+    return jsonify(count=len(data), data=data)
+
+
+#  JSON API v1
+#  ----------------------------------------------------------------
+
+
+def api_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def api_response(version, build):
+    # ETag from the row-version aggregate; an If-None-Match matching it
+    # (weakly, as RFC 7232 compares them) gets a 304 before build()
+    # assembles any data
+    if version is None:
+        return jsonify(error='not found'), 404
+    etag = hashlib.sha1(repr(version).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(json.dumps(build(), default=api_default),
+                            mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+def api_version(query):
+    try:
+        return query()
     except ():
         db.session.rollback()
     finally:
         db.session.close()
-    return render_template('pages/shows.html', shows=data)
+
+
+@app.route('/api/v1/venues')
+def api_venues():
+    genre = request.args.get('genre')
+    state = request.args.get('state')
+    version = api_version(venue_directory_version) + (genre, state)
+    return api_response(version, lambda: {
+        "areas": directory_data(genre=genre, state=state)})
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+    return api_response(api_version(lambda: venue_version(venue_id)),
+                        lambda: detail_data('venue', venue_id))
+
+
+@app.route('/api/v1/artists')
+def api_artists():
+    genre = request.args.get('genre')
+    state = request.args.get('state')
+    version = api_version(artist_listing_version) + (genre, state)
+
+    def build():
+        try:
+            return {"artists": [row._asdict() for row in artist_listing(
+                genre=genre, state=state)]}
+        finally:
+            db.session.close()
+    return api_response(version, build)
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+    return api_response(api_version(lambda: artist_version(artist_id)),
+                        lambda: detail_data('artist', artist_id))
+
+
+@app.route('/api/v1/shows')
+def api_shows():
+    # the page itself is bounded, so its versions come from the rows
+    rows, next_after, per_page, scope = shows_page_data()
+    version = ('shows', next_after) + tuple(
+        (row.id, row.version, row.venue_version, row.artist_version)
+        for row in rows)
+    return api_response(version, lambda: {
+        "shows": [{
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time
+        } for row in rows],
+        "next": next_after and format_show_cursor(next_after)
+    })
+
+
+#  Export API
+#  ----------------------------------------------------------------
+
+@app.route('/api/export/<any(venues, artists, shows):entity>')
+def api_export(entity):
+    # streams the catalogue as JSON lines (default) or ?format=csv, gzipped
+    # on the fly when the client accepts it. filters: ?since=&until= (ISO
+    # dates, shows only), ?city=, ?state=, ?genre=
+    format = request.args.get('format', 'jsonl')
+    if format not in ('jsonl', 'csv'):
+        abort(400)
+    try:
+        filters = export_filters(request.args)
+    except ValueError:
+        abort(400)
+    gzip = request.accept_encodings['gzip'] > 0
+    response = Response(
+        stream_with_context(export_stream(entity, format, gzip, **filters)),
+        mimetype='text/csv' if format == 'csv' else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(
+        entity, format)
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    # the body depends on Accept-Encoding, so shared caches must key on it
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def export_filters(args):
+    filters = {key: args.get(key) for key in ('city', 'state', 'genre')}
+    for key in ('since', 'until'):
+        filters[key] = datetime.fromisoformat(args[key]) if args.get(key) else None
+    return filters
+
+
+#  Internal
+#  ----------------------------------------------------------------
+
+@app.route('/internal/cache')
+def cache_stats():
+    return jsonify(page_cache.stats())
+
+
+@app.route('/internal/pool')
+def pool_stats():
+    return jsonify(pool_monitor.stats(db.engine.pool))
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(route_metrics.exposition(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/internal/templates')
+def template_timings():
+    return jsonify(template_stats())
+
+
+@app.route('/internal/replicas')
+def replica_stats():
+    return jsonify(db.router.stats())
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.command('import')
+@click.argument('entity', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']),
+              help='Defaults to csv for .csv files, jsonl otherwise.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--rejects', type=click.Path(dir_okay=False),
+              help='Rejected rows report, defaults to PATH.rejects.csv.')
+def import_command(entity, path, format, batch_size, rejects):
+    """Bulk import venues, artists or shows from a CSV or JSON-lines file."""
+    importer, elapsed = import_file(entity, path, format, batch_size, rejects)
+    click.echo('Imported {} {} in {:.1f}s ({:.0f} rows/s), rejected {}.'.format(
+        importer.imported, entity, elapsed,
+        importer.imported / elapsed if elapsed else 0, len(importer.rejected)))
+    # only a shared backend can be reached from here; each web worker's own
+    # memory cache lets the imported pages go within its ttl
+    if page_cache.backend.name == 'redis':
+        page_cache.invalidate(*importer.touched)
+    elif importer.touched:
+        click.echo('Pages cached by running web workers may show the old data '
+                   'for up to {}s.'.format(app.config['PAGE_CACHE_LOCAL_TTL']))
+    if importer.rejected:
+        click.echo('Rejected rows written to {}.'.format(
+            rejects or path + '.rejects.csv'))
+
+
+@app.cli.command('export')
+@click.argument('entity', type=click.Choice(['venues', 'artists', 'shows']))
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='Defaults to stdout.')
+@click.option('--format', type=click.Choice(['jsonl', 'csv']), default='jsonl',
+              show_default=True)
+@click.option('--gzip', is_flag=True, help='Gzip the output.')
+@click.option('--since', type=click.DateTime(), help='Shows starting at or after.')
+@click.option('--until', type=click.DateTime(), help='Shows starting before.')
+@click.option('--city')
+@click.option('--state')
+@click.option('--genre')
+def export_command(entity, output, format, gzip, **filters):
+    """Stream venues, artists or shows out as JSON lines or CSV."""
+    for chunk in export_stream(entity, format, gzip, **filters):
+        output.write(chunk)
+
+
+@app.cli.command('show-counts')
+@click.option('--rebuild', is_flag=True,
+              help='Recount every venue and artist from the show table.')
+def show_counts_command(rebuild):
+    """Move shows that have started from the upcoming to the past counters.
+
+    Run it periodically (e.g. every few minutes from cron) to keep the
+    window of started-but-uncounted shows that listings correct for small.
+    """
+    if rebuild:
+        rebuild_show_counts()
+        click.echo('Rebuilt show counters.')
+    else:
+        click.echo('Moved {} started shows to the past counters.'.format(
+            roll_show_counts()))
+    db.session.commit()
+
+
+@app.cli.command('areas')
+def areas_command():
+    """Rebuild the materialised venue areas behind /venues."""
+    rebuild_areas(db.session.connection())
+    db.session.commit()
+    click.echo('Rebuilt venue areas.')
+
+
+@app.cli.command('assets')
+def assets_command():
+    """Build the fingerprinted, precompressed CSS and JS bundles."""
+    for name, files, source_bytes, sizes in build_assets(app.static_folder):
+        click.echo('{}: {} files, {} bytes -> 1 file, {}'.format(
+            name, files, source_bytes, ', '.join(
+                '{} {} bytes'.format(variant, size) for variant, size in sizes.items())))
+    assets.load()
 
 
 @app.errorhandler(404)
@@ -573,14 +905,12 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    log_listener = init_logging(
+        app, app.config['LOG_FILE'],
+        level=app.config['LOG_LEVEL'],
+        max_bytes=app.config['LOG_MAX_BYTES'],
+        backup_count=app.config['LOG_BACKUP_COUNT'],
+        queue_size=app.config['LOG_QUEUE_SIZE'])
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
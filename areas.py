@@ -0,0 +1,108 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from models import db, Venue, VenueArea
+
+#----------------------------------------------------------------------------#
+# Venue areas.
+#
+# venue_area holds the /venues directory ready-made: one row per city/state
+# with its venues' ids, names and upcoming show counters. Venue writes mark
+# their old and new areas, which are recomputed once per flush; counter
+# updates in counters.py refresh the areas of the venues they touch.
+#----------------------------------------------------------------------------#
+
+area_table = VenueArea.__table__
+venue_table = Venue.__table__
+
+
+def area_venues(connection, city, state):
+    rows = connection.execute(
+        db.select([venue_table.c.id, venue_table.c.name,
+                   venue_table.c.upcoming_show_count])
+        .where(venue_table.c.state == state).where(venue_table.c.city == city)
+        .order_by(venue_table.c.name, venue_table.c.id)).fetchall()
+    return [{"id": row.id, "name": row.name, "upcoming_show_count": row.upcoming_show_count}
+            for row in rows]
+
+
+def refresh_area(connection, city, state):
+    # the area row is locked before its venues are read, so concurrent
+    # refreshes of one area apply in turn and the last one sees every
+    # committed venue change. A missing row locks nothing: when another
+    # transaction inserts it first, the insert fails and the now existing
+    # row is locked and its venues read again.
+    where = (area_table.c.state == state) & (area_table.c.city == city)
+    exists = connection.execute(
+        db.select([area_table.c.id]).where(where).with_for_update()).scalar()
+    venues = area_venues(connection, city, state)
+    if not venues:
+        connection.execute(area_table.delete().where(where))
+    elif exists:
+        connection.execute(area_table.update().where(where).values(venues=venues))
+    else:
+        try:
+            with connection.begin_nested():
+                connection.execute(area_table.insert().values(
+                    city=city, state=state, venues=venues))
+        except IntegrityError:
+            refresh_area(connection, city, state)
+
+
+def refresh_areas(connection, areas):
+    # recomputes the given (city, state) rows, in one order so concurrent
+    # refreshes lock them alike
+    for city, state in sorted(areas):
+        refresh_area(connection, city, state)
+
+
+def refresh_venue_areas(connection, venue_ids):
+    # refreshes the areas of the given venues, after their counters changed
+    if not venue_ids:
+        return
+    areas = connection.execute(
+        db.select([venue_table.c.city, venue_table.c.state]).distinct()
+        .where(venue_table.c.id.in_(list(venue_ids)))).fetchall()
+    refresh_areas(connection, {tuple(area) for area in areas})
+
+
+def rebuild_areas(connection):
+    # recomputes every area, e.g. from a scheduled job or after a bulk load
+    # that skipped the ORM
+    connection.execute(area_table.delete())
+    areas = connection.execute(
+        db.select([venue_table.c.city, venue_table.c.state]).distinct()).fetchall()
+    refresh_areas(connection, {tuple(area) for area in areas})
+
+
+def touch(venue, *areas):
+    session = object_session(venue)
+    if session is not None:
+        session.info.setdefault('venue_areas', set()).update(areas)
+
+
+@event.listens_for(Venue, 'after_insert')
+@event.listens_for(Venue, 'after_delete')
+def venue_written(mapper, connection, venue):
+    touch(venue, (venue.city, venue.state))
+
+
+@event.listens_for(Venue, 'after_update')
+def venue_updated(mapper, connection, venue):
+    attrs = inspect(venue).attrs
+    if not any(attrs[name].history.has_changes() for name in ('name', 'city', 'state')):
+        return
+    areas = {(venue.city, venue.state)}
+    city_history = attrs.city.history
+    state_history = attrs.state.history
+    if city_history.deleted or state_history.deleted:
+        areas.add(((city_history.deleted or [venue.city])[0],
+                   (state_history.deleted or [venue.state])[0]))
+    touch(venue, *areas)
+
+
+@event.listens_for(Session, 'after_flush')
+def refresh_touched_areas(session, flush_context):
+    areas = session.info.pop('venue_areas', None)
+    if areas:
+        refresh_areas(session.connection(), areas)
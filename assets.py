@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from flask import request, send_from_directory, url_for
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#----------------------------------------------------------------------------#
+
+# bundle name -> source files, relative to static/. Each bundle is written
+# next to its sources (css/site.<hash>.css) so relative url()s keep working.
+BUNDLES = {
+    'css/site.css': ['css/bootstrap.min.css', 'css/layout.main.css',
+                     'css/main.css', 'css/main.responsive.css',
+                     'css/main.quickfix.css'],
+    'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'js/site.js': ['js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js',
+                   'js/script.js'],
+}
+
+MANIFEST = 'assets.json'
+# sibling files tried in order of preference, by Accept-Encoding
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # only whole-line comments, indentation and blank lines are removed;
+    # anything smarter needs a real JS parser
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def bundle_text(static_folder, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        if '.min.' not in source:
+            text = minify_css(text) if source.endswith('.css') else minify_js(text)
+        parts.append(text)
+    # a ; between scripts keeps one file's last statement from running into
+    # the next file's first
+    return ('\n' if sources[0].endswith('.css') else ';\n').join(parts)
+
+
+def compress(path, data):
+    # .gz and, with the brotli package installed, .br siblings of path
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, 9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def build_assets(static_folder, bundles=BUNDLES):
+    # writes every bundle under a content-hashed name with precompressed
+    # siblings, then the manifest mapping bundle names to those files.
+    # Returns (name, source count, source bytes, sizes by variant) per bundle.
+    manifest = {}
+    report = []
+    for name, sources in sorted(bundles.items()):
+        data = bundle_text(static_folder, sources).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        base, ext = os.path.splitext(name)
+        built = '{}.{}{}'.format(base, digest, ext)
+        path = os.path.join(static_folder, built)
+        with open(path, 'wb') as f:
+            f.write(data)
+        compress(path, data)
+        manifest[name] = built
+        sizes = {'raw': len(data)}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(path + suffix):
+                sizes[encoding] = os.path.getsize(path + suffix)
+        source_bytes = sum(os.path.getsize(os.path.join(static_folder, source))
+                           for source in sources)
+        report.append((name, len(sources), source_bytes, sizes))
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return report
+
+
+class Assets(object):
+    # asset_urls(name) in templates gives the one fingerprinted bundle URL
+    # once `flask assets` has been run, and the separate source files
+    # until then. Bundles are served precompressed when the client accepts
+    # it, with a far-future immutable Cache-Control.
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.built = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_age = app.config.get('ASSET_MAX_AGE', 31536000)
+        self.load()
+        app.jinja_env.globals['asset_urls'] = self.urls
+        self.static_view = app.view_functions['static']
+        app.view_functions['static'] = self.send_static
+
+    def load(self):
+        path = os.path.join(self.app.static_folder, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+        self.built = set(self.manifest.values())
+
+    def urls(self, name):
+        if name in self.manifest:
+            return [url_for('static', filename=self.manifest[name])]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def send_static(self, filename):
+        if filename not in self.built:
+            return self.static_view(filename=filename)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            if (encoding in request.accept_encodings and os.path.exists(
+                    os.path.join(self.app.static_folder, filename + suffix))):
+                response = send_from_directory(
+                    self.app.static_folder, filename + suffix, mimetype=mimetype,
+                    max_age=self.max_age)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(
+                self.app.static_folder, filename, mimetype=mimetype,
+                max_age=self.max_age)
+        response.vary.add('Accept-Encoding')
+        # the name changes whenever the content does, so it never needs
+        # revalidating
+        response.cache_control.immutable = True
+        return response
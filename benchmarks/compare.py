@@ -0,0 +1,44 @@
+#----------------------------------------------------------------------------#
+# Load test report diff.
+#
+# Compares two --json reports from load.py route by route, e.g. from before
+# and after a change:
+#
+#   python benchmarks/compare.py before.json after.json
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+
+COLUMNS = ['rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'db_ms']
+
+
+def change(before, after):
+    if before is None or after is None:
+        return 'n/a'
+    if not before:
+        return '%.1f' % after
+    return '%+.0f%%' % ((after - before) * 100.0 / before)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print('%s -> %s' % (before.get('commit'), after.get('commit')))
+    print('%-16s' % 'route' + ''.join('%10s' % column for column in COLUMNS))
+    for name in sorted(set(before['routes']) | set(after['routes'])):
+        old = before['routes'].get(name, {})
+        new = after['routes'].get(name, {})
+        print('%-16s' % name + ''.join(
+            '%10s' % change(old.get(column), new.get(column)) for column in COLUMNS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#----------------------------------------------------------------------------#
+# Datetime filter micro-benchmark.
+#
+# Compares the old strftime -> dateutil.parse -> babel round trip with the
+# current `datetime` Jinja filter on a batch of show start times.
+#
+#   python benchmarks/datetime_filter.py --shows 1000 --rounds 20
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+from app import format_datetime, render_datetime
+
+
+def old_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=1000)
+    parser.add_argument('--distinct', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 1, 20, 0)
+    dates = [start + timedelta(hours=i % args.distinct) for i in range(args.shows)]
+    strings = [d.strftime('%Y-%m-%d %H:%I') for d in dates]
+
+    def old():
+        for value in strings:
+            old_format_datetime(value, 'full')
+
+    def new():
+        for value in dates:
+            format_datetime(value, 'full')
+
+    def new_cold():
+        render_datetime.cache_clear()
+        new()
+
+    for name, fn in (('old', old), ('new (cold memo)', new_cold), ('new', new)):
+        seconds = min(timeit.repeat(fn, number=1, repeat=args.rounds))
+        print('%-16s %10.0f formats/s' % (name, args.shows / seconds))
+
+
+if __name__ == '__main__':
+    main()
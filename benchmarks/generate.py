@@ -0,0 +1,123 @@
+#----------------------------------------------------------------------------#
+# Benchmark data generator.
+#
+# Seeds a database with venues, artists and shows in batched core inserts,
+# tags them with genres, then rebuilds the show counters and venue areas the
+# app maintains on write. The same --seed gives the same data, so runs on
+# different commits are comparable.
+#
+#   python benchmarks/generate.py --database-url postgresql://.../fyyur_bench \
+#       --venues 10000 --artists 100000 --shows 5000000
+#
+# Point it at a throwaway database: it creates the tables and appends rows.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+          'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Other']
+AREAS = [('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+         ('Portland', 'OR'), ('Portland', 'ME'), ('Austin', 'TX'),
+         ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN'),
+         ('New Orleans', 'LA')]
+
+
+def seed(db, Venue, Artist, Show, venues, artists, shows, batch=10000,
+         rng=random, now=None):
+    # appends the rows in batches of batch, committing after each one
+    from models import Genre, venue_genre, artist_genre
+    from counters import rebuild_show_counts
+    if now is None:
+        now = datetime.now()
+    genre_ids = dict(db.session.query(Genre.name, Genre.id))
+    missing = [{"name": name} for name in GENRES if name not in genre_ids]
+    if missing:
+        db.session.execute(Genre.__table__.insert(), missing)
+        genre_ids = dict(db.session.query(Genre.name, Genre.id))
+    first_venue = (db.session.query(db.func.max(Venue.id)).scalar() or 0) + 1
+    first_artist = (db.session.query(db.func.max(Artist.id)).scalar() or 0) + 1
+
+    def insert(model, association, key, count, first, values):
+        for start in range(0, count, batch):
+            rows, links = [], []
+            for i in range(start, min(start + batch, count)):
+                tags = rng.sample(GENRES, rng.randint(1, 3))
+                city, state = AREAS[i % len(AREAS)]
+                rows.append(dict(values(i), id=first + i, city=city,
+                                 state=state, genres=','.join(tags)))
+                links.extend({key: first + i, "genre_id": genre_ids[tag]}
+                             for tag in tags)
+            db.session.execute(model.__table__.insert(), rows)
+            db.session.execute(association.insert(), links)
+            db.session.commit()
+        if db.engine.dialect.name == 'postgresql':
+            # ids were given explicitly, so move the sequence past them
+            db.session.execute(db.text(
+                "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                "(SELECT max(id) FROM {}))".format(model.__tablename__)),
+                {'table': model.__tablename__})
+            db.session.commit()
+
+    insert(Venue, venue_genre, 'venue_id', venues, first_venue, lambda i: {
+        "name": "Venue %d" % (first_venue + i),
+        "address": "%d Main St" % i,
+        "phone": "123-123-1234",
+        "image_link": "https://example.com/venue.jpg",
+        "searching_talent": i % 3 == 0,
+    })
+    insert(Artist, artist_genre, 'artist_id', artists, first_artist, lambda i: {
+        "name": "Artist %d" % (first_artist + i),
+        "phone": "123-123-1234",
+        "image_link": "https://example.com/artist.jpg",
+        "searching_venues": i % 4 == 0,
+    })
+
+    for start in range(0, shows, batch):
+        db.session.execute(Show.__table__.insert(), [{
+            "date": now + timedelta(minutes=rng.randint(-525600, 525600)),
+            "venue_id": rng.randint(first_venue, first_venue + venues - 1),
+            "artist_id": rng.randint(first_artist, first_artist + artists - 1),
+        } for _ in range(start, min(start + batch, shows))])
+        db.session.commit()
+
+    # core inserts skip the events keeping these up to date
+    rebuild_show_counts(now)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--shows', type=int, default=5000000)
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    config.SQLALCHEMY_DATABASE_URI = args.database_url
+    from app import app, db, Venue, Artist, Show
+    from models import create_schema
+
+    started = time.perf_counter()
+    with app.app_context():
+        create_schema()
+        seed(db, Venue, Artist, Show, args.venues, args.artists, args.shows,
+             args.batch, random.Random(args.seed))
+    print('seeded %d venues, %d artists and %d shows in %.1fs' % (
+        args.venues, args.artists, args.shows, time.perf_counter() - started))
+
+
+if __name__ == '__main__':
+    main()
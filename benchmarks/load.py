@@ -0,0 +1,289 @@
+#----------------------------------------------------------------------------#
+# Route load test.
+#
+# Drives a running Fyyur server with a weighted mix of every page, search and
+# write route from --concurrency asyncio clients (keep-alive connections, no
+# dependencies beyond the standard library) for --duration seconds, then
+# reports per route: requests, errors, throughput, p50/p95/p99 latency and
+# the mean query count and DB time taken from the Server-Timing header.
+#
+#   python benchmarks/generate.py --database-url postgresql://.../fyyur_bench
+#   DATABASE_URL=postgresql://.../fyyur_bench python app.py &
+#   python benchmarks/load.py --url http://127.0.0.1:5000 --json before.json
+#   ... check out another commit, restart the server ...
+#   python benchmarks/load.py --url http://127.0.0.1:5000 --json after.json
+#   python benchmarks/compare.py before.json after.json
+#
+# It imports nothing from the app (SQLAlchemy only for --database-url), so
+# copy it and compare.py out of the tree before checking out older commits.
+# Commits without the JSON API get their ids from --database-url instead;
+# without the Server-Timing header the query and DB time columns read n/a.
+#----------------------------------------------------------------------------#
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import subprocess
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+from urllib.request import urlopen
+
+GENRES = ['Jazz', 'Rock n Roll', 'Folk', 'Hip-Hop', 'Classical']
+TERMS = ['venue', 'artist', 'venue 1', 'artist 12', 'hop', 'band', 'live']
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def venue_form(rng, ids, id=None):
+    # a new venue, or venue id under its own name and area so that editing
+    # it leaves the directory as it was
+    if id is None:
+        name = 'Load venue %d' % rng.randint(1, 10 ** 9)
+        city, state = rng.choice(ids['areas'])
+    else:
+        name, city, state = ids['venue_info'][id]
+    return [('name', name), ('city', city), ('state', state),
+            ('address', '1 Main St'), ('phone', '123-123-1234'),
+            ('genres', rng.choice(GENRES)),
+            ('image_link', 'https://example.com/venue.jpg'),
+            ('facebook_link', 'https://www.facebook.com/venue'),
+            ('website_link', 'https://example.com'),
+            ('seeking_description', '')]
+
+
+def artist_form(rng, ids):
+    city, state = rng.choice(ids['areas'])
+    return [('name', 'Load artist %d' % rng.randint(1, 10 ** 9)),
+            ('city', city), ('state', state), ('phone', '123-123-1234'),
+            ('genres', rng.choice(GENRES)),
+            ('image_link', 'https://example.com/artist.jpg'),
+            ('facebook_link', 'https://www.facebook.com/artist'),
+            ('website_link', 'https://example.com'),
+            ('seeking_description', '')]
+
+
+# route name, weight, write route, request builder(rng, ids) -> (method, path, form)
+ROUTES = [
+    ('venues', 10, False, lambda rng, ids: ('GET', '/venues', None)),
+    ('artists', 10, False, lambda rng, ids: ('GET', '/artists', None)),
+    ('shows', 10, False, lambda rng, ids: ('GET', '/shows', None)),
+    ('show_venue', 15, False, lambda rng, ids: (
+        'GET', '/venues/%d' % rng.choice(ids['venues']), None)),
+    ('show_artist', 15, False, lambda rng, ids: (
+        'GET', '/artists/%d' % rng.choice(ids['artists']), None)),
+    ('search_venues', 8, False, lambda rng, ids: (
+        'POST', '/venues/search', [('search_term', rng.choice(TERMS))])),
+    ('search_artists', 8, False, lambda rng, ids: (
+        'POST', '/artists/search', [('search_term', rng.choice(TERMS))])),
+    ('api_search', 8, False, lambda rng, ids: (
+        'GET', '/api/search?' + urlencode({'q': rng.choice(TERMS)[:rng.randint(1, 5)]}), None)),
+    ('create_venue', 1, True, lambda rng, ids: (
+        'POST', '/venues/create', venue_form(rng, ids))),
+    ('edit_venue', 1, True, lambda rng, ids: (
+        lambda id: ('POST', '/venues/%d/edit' % id, venue_form(rng, ids, id)))(
+            rng.choice(ids['venues']))),
+    ('create_artist', 1, True, lambda rng, ids: (
+        'POST', '/artists/create', artist_form(rng, ids))),
+    ('create_show', 1, True, lambda rng, ids: (
+        'POST', '/shows/create', [
+            ('venue_id', str(rng.choice(ids['venues']))),
+            ('artist_id', str(rng.choice(ids['artists']))),
+            ('start_time', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(
+                time.time() + rng.randint(3600, 86400 * 90))))])),
+]
+
+
+class Connection(object):
+    # one keep-alive HTTP/1.1 connection, reopened whenever the server
+    # closes it
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, form=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = urlencode(form).encode() if form is not None else b''
+        head = ['%s %s HTTP/1.1' % (method, path), 'Host: %s:%d' % (self.host, self.port),
+                'Connection: keep-alive', 'Content-Length: %d' % len(body)]
+        if form is not None:
+            head.append('Content-Type: application/x-www-form-urlencoded')
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        try:
+            return await self.response()
+        except Exception:
+            await self.close()
+            raise
+
+    async def response(self):
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        size = 0
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                length = int((await self.reader.readline()).split(b';')[0], 16)
+                size += len(await self.reader.readexactly(length + 2)) - 2
+                if length == 0:
+                    break
+        elif 'content-length' in headers:
+            size = len(await self.reader.readexactly(int(headers['content-length'])))
+        else:
+            size = len(await self.reader.read())
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, headers, size
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def client(url, routes, ids, deadline, results, seed):
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    connection = Connection(parts.hostname, parts.port or 80)
+    names = [route[0] for route in routes]
+    weights = [route[1] for route in routes]
+    builders = {route[0]: route[3] for route in routes}
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, form = builders[name](rng, ids)
+        started = time.perf_counter()
+        try:
+            status, headers, size = await connection.request(method, path, form)
+        except Exception:
+            results[name]['errors'] += 1
+            continue
+        elapsed = (time.perf_counter() - started) * 1000
+        result = results[name]
+        result['latencies'].append(elapsed)
+        if status >= 400:
+            result['errors'] += 1
+        timing = SERVER_TIMING_DB.search(headers.get('server-timing', ''))
+        if timing:
+            result['db_ms'] += float(timing.group(1))
+            result['queries'] += int(timing.group(2))
+            result['timed'] += 1
+    await connection.close()
+
+
+def discover_ids(url, database_url=None):
+    # venues (id -> name, city, state) and artist ids through the JSON API,
+    # so any seeded data works; commits without the API read the database
+    try:
+        with urlopen(url + '/api/v1/venues') as response:
+            venues = {venue['id']: (venue['name'], area['city'], area['state'])
+                      for area in json.load(response)['areas']
+                      for venue in area['venues']}
+        with urlopen(url + '/api/v1/artists') as response:
+            artists = [artist['id'] for artist in json.load(response)['artists']]
+    except (OSError, ValueError, KeyError):
+        if database_url is None:
+            raise SystemExit('%s has no /api/v1 listings; pass --database-url' % url)
+        from sqlalchemy import create_engine, text
+        engine = create_engine(database_url)
+        with engine.connect() as connection:
+            venues = {row.id: (row.name, row.city, row.state) for row in connection.execute(
+                text('SELECT id, name, city, state FROM venue'))}
+            artists = [row.id for row in connection.execute(text('SELECT id FROM artist'))]
+        engine.dispose()
+    return {'venues': sorted(venues), 'venue_info': venues, 'artists': artists,
+            'areas': sorted({(city, state) for _, city, state in venues.values()})}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+
+def summarise(results, elapsed):
+    report = {}
+    for name, result in sorted(results.items()):
+        latencies = result['latencies']
+        count = len(latencies)
+        report[name] = {
+            'requests': count,
+            'errors': result['errors'],
+            'rps': count / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries': result['queries'] / result['timed'] if result['timed'] else None,
+            'db_ms': result['db_ms'] / result['timed'] if result['timed'] else None,
+        }
+    return report
+
+
+def print_report(report):
+    print('%-16s %8s %6s %8s %8s %8s %8s %8s %8s' % (
+        'route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+        'queries', 'db ms'))
+    for name, row in report.items():
+        print('%-16s %8d %6d %8.1f %8.1f %8.1f %8.1f %8s %8s' % (
+            name, row['requests'], row['errors'], row['rps'], row['p50_ms'],
+            row['p95_ms'], row['p99_ms'],
+            'n/a' if row['queries'] is None else '%.1f' % row['queries'],
+            'n/a' if row['db_ms'] is None else '%.1f' % row['db_ms']))
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    routes = [route for route in ROUTES
+              if (args.writes or not route[2])
+              and (not args.routes or route[0] in args.routes)]
+    ids = discover_ids(args.url, args.database_url)
+    results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'queries': 0,
+                                   'db_ms': 0.0, 'timed': 0})
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*[
+        client(args.url, routes, ids, deadline, results, args.seed + number)
+        for number in range(args.concurrency)])
+    return summarise(results, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--database-url',
+                        help='where to read ids from when the server has no JSON API')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds to run for')
+    parser.add_argument('--routes', nargs='*', help='only these route names')
+    parser.add_argument('--no-writes', dest='writes', action='store_false',
+                        help='leave out the create/edit POSTs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': commit(), 'concurrency': args.concurrency,
+                       'duration': args.duration, 'routes': report},
+                      f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#----------------------------------------------------------------------------#
+# Per-route loading benchmark.
+#
+# Seeds an in-memory SQLite database (or --database-url) and reports, for each
+# read route, how many rows and ORM objects it materialises, its peak Python
+# memory and its latency. Run it on two commits to compare loading strategies.
+#
+#   python benchmarks/loading.py --shows 50000
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from sqlalchemy import event
+from generate import seed
+
+ROUTES = ['/venues', '/venues/1', '/artists', '/artists/1', '/shows',
+          '/venues/1/edit', '/artists/1/edit']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--venues', type=int, default=100)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    config.SQLALCHEMY_DATABASE_URI = args.database_url
+    from app import app, db, Venue, Artist, Show
+    from models import create_schema
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    loaded = Counter()
+    rows = Counter()
+
+    for model in (Venue, Artist, Show):
+        event.listen(model, 'load',
+                     lambda target, context: loaded.update([type(target).__name__]))
+
+    with app.app_context():
+        if not args.skip_seed:
+            create_schema()
+            seed(db, Venue, Artist, Show, args.venues, args.artists, args.shows)
+
+        @event.listens_for(db.engine, 'after_cursor_execute')
+        def count_rows(conn, cursor, statement, parameters, context, executemany):
+            rows['queries'] += 1
+
+        client = app.test_client()
+        print('%-18s %8s %8s %8s %8s %10s %10s' % (
+            'route', 'queries', 'venues', 'artists', 'shows', 'peak KiB', 'ms'))
+        for url in ROUTES:
+            loaded.clear()
+            rows.clear()
+            tracemalloc.start()
+            started = time.perf_counter()
+            response = client.get(url)
+            # streamed pages render while being read
+            response.get_data()
+            response.close()
+            elapsed = (time.perf_counter() - started) * 1000
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('%-18s %8d %8d %8d %8d %10d %10.1f' % (
+                url, rows['queries'], loaded['Venue'], loaded['Artist'],
+                loaded['Show'], peak // 1024, elapsed))
+
+
+if __name__ == '__main__':
+    main()
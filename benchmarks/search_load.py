@@ -0,0 +1,66 @@
+#----------------------------------------------------------------------------#
+# Search-as-you-type load test.
+#
+# Simulates concurrent typists against a running Fyyur server: each typist
+# types a search term one keystroke at a time, calling /api/search after every
+# keystroke, and the script reports latency percentiles over all lookups.
+#
+#   python app.py &
+#   python benchmarks/search_load.py --url http://127.0.0.1:5000 --typists 200
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+TERMS = ['the musical hop', 'park square', 'music', 'band', 'wild sax',
+         'guns n petals', 'matt quevado', 'jazz', 'hop', 'live']
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def typist(url, kind, term, pause):
+    latencies = []
+    for end in range(1, len(term) + 1):
+        query = urlencode({'q': term[:end], 'type': kind, 'limit': 8})
+        started = time.perf_counter()
+        with urlopen('{}/api/search?{}'.format(url, query)) as response:
+            json.load(response)
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(pause)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--typists', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--pause', type=float, default=0.15,
+                        help='seconds between keystrokes')
+    args = parser.parse_args()
+
+    latencies = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.typists) as pool:
+        jobs = [pool.submit(typist, args.url, random.choice(['venue', 'artist']),
+                            random.choice(TERMS), args.pause)
+                for _ in range(args.typists * args.rounds)]
+        for job in jobs:
+            latencies.extend(job.result())
+    elapsed = time.perf_counter() - started
+
+    print('requests  %d (%.0f/s)' % (len(latencies), len(latencies) / elapsed))
+    for pct in (50, 95, 99):
+        print('p%-8d %.1f ms' % (pct, percentile(latencies, pct)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#----------------------------------------------------------------------------#
+# Show index benchmark.
+#
+# Seeds a local database with venues, artists and (by default) 1M shows, then
+# times the venue/artist detail pages and the venue directory with the show
+# indexes dropped and again with them created.
+#
+#   python benchmarks/show_indexes.py --database-url postgresql://.../fyyur_bench
+#
+# Point it at a throwaway database: it creates the tables and drops/recreates
+# the show indexes.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from generate import seed
+
+
+def time_pages(client, page_cache, urls, repeat):
+    # the page cache is emptied before every request, so each one queries
+    # the database rather than timing a cache hit
+    results = {}
+    for url in urls:
+        fetch(client, url)
+        elapsed = 0.0
+        for _ in range(repeat):
+            page_cache.clear()
+            started = time.perf_counter()
+            fetch(client, url)
+            elapsed += time.perf_counter() - started
+        results[url] = elapsed / repeat * 1000
+    return results
+
+
+def fetch(client, url):
+    # streamed pages only finish rendering once read
+    response = client.get(url)
+    response.get_data()
+    response.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default=config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    config.SQLALCHEMY_DATABASE_URI = args.database_url
+    from app import app, db, page_cache, Venue, Artist, Show
+    from models import create_schema
+
+    with app.app_context():
+        if not args.skip_seed:
+            create_schema()
+            seed(db, Venue, Artist, Show, args.venues, args.artists, args.shows)
+
+        indexes = list(Show.__table__.indexes)
+        urls = ['/venues/1', '/artists/1', '/venues']
+        client = app.test_client()
+
+        for index in indexes:
+            index.drop(db.engine, checkfirst=True)
+        before = time_pages(client, page_cache, urls, args.repeat)
+
+        for index in indexes:
+            index.create(db.engine, checkfirst=True)
+        after = time_pages(client, page_cache, urls, args.repeat)
+
+    print('%-20s %12s %12s' % ('page', 'no index ms', 'indexed ms'))
+    for url in urls:
+        print('%-20s %12.2f %12.2f' % (url, before[url], after[url]))
+
+
+if __name__ == '__main__':
+    main()
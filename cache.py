@@ -0,0 +1,169 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+#----------------------------------------------------------------------------#
+# Caches.
+#----------------------------------------------------------------------------#
+
+
+class LRUBackend(object):
+    # thread-safe in-process cache; the least recently used entry is evicted
+    # beyond maxsize and entries set with a ttl expire after ttl seconds.
+    name = 'memory'
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TTLCache(LRUBackend):
+    # LRUBackend whose entries all expire ttl seconds after being set.
+
+    def __init__(self, ttl, maxsize=1024):
+        super(TTLCache, self).__init__(maxsize)
+        self.ttl = ttl
+
+    def set(self, key, value, ttl=None):
+        super(TTLCache, self).set(key, value, self.ttl if ttl is None else ttl)
+
+
+class RedisBackend(object):
+    # stores pickled values in anything speaking the redis-py client API
+    # (GET, SET with PX, DEL, SCAN), e.g. a Redis server or a local stand-in.
+    name = 'redis'
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        px = None if ttl is None else max(int(ttl * 1000), 1)
+        self.client.set(self.prefix + key, pickle.dumps(value), px=px)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        # every key under this backend's prefix, leaving others alone
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class PageCache(object):
+    # caches assembled detail-page data per (kind, id) on top of a backend,
+    # counting hits, misses and invalidations.
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, id):
+        return 'page:{}:{}'.format(kind, id)
+
+    def get(self, kind, id):
+        value = self.backend.get(self.key(kind, id))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, kind, id, value, ttl=None):
+        self.backend.set(self.key(kind, id), value,
+                         self.ttl if ttl is None else ttl)
+
+    def set_until(self, kind, id, value, boundary, ttl=None):
+        # keeps value until boundary, the instant it goes stale on its own
+        # (the earliest upcoming show starting), capped by the cache ttl and
+        # by ttl. The ttl is counted from now, when the backend starts its
+        # clock, so time spent assembling value cannot stretch it past
+        # boundary.
+        caps = [cap for cap in (self.ttl, ttl) if cap is not None]
+        if boundary is not None:
+            caps.append((boundary - datetime.now()).total_seconds())
+        ttl = min(caps) if caps else None
+        if ttl is not None and ttl <= 0:
+            return
+        self.backend.set(self.key(kind, id), value, ttl)
+
+    def invalidate(self, *keys):
+        # keys are (kind, id) pairs
+        self.backend.delete(*[self.key(kind, id) for kind, id in keys])
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+def make_page_cache(config):
+    if config['PAGE_CACHE_BACKEND'] == 'redis':
+        backend = RedisBackend.from_url(config['PAGE_CACHE_REDIS_URL'])
+    else:
+        backend = LRUBackend(config['PAGE_CACHE_SIZE'])
+    ttl = config['PAGE_CACHE_TTL']
+    if backend.name == 'memory':
+        local_ttl = config['PAGE_CACHE_LOCAL_TTL']
+        ttl = local_ttl if ttl is None else min(ttl, local_ttl)
+    return PageCache(backend, ttl=ttl)
@@ -0,0 +1,112 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import bindparam, event
+from models import db, Venue, Artist, Show, ShowCountClock
+from areas import rebuild_areas, refresh_venue_areas
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# venue/artist.upcoming_show_count and past_show_count split each entity's
+# shows at show_count_clock.counted_at. Inserting or deleting a show adjusts
+# them in the same transaction; roll_show_counts() moves shows that have
+# started since from upcoming to past and advances the clock. Readers
+# subtract the shows started since counted_at (see queries.py), so counts
+# are exact however long ago the last roll was. Venue counter changes are
+# copied into the venue_area directory rows (see areas.py).
+#----------------------------------------------------------------------------#
+
+clock = ShowCountClock.__table__
+COUNTED = [(Venue.__table__, 'venue_id'), (Artist.__table__, 'artist_id')]
+
+
+def counted_at(connection, lock=None):
+    # the clock, creating it on a database built without migrations (where
+    # no show has been counted yet). lock is None, 'share' or 'update'.
+    query = db.select([clock.c.counted_at]).where(clock.c.id == 1)
+    if lock is not None:
+        query = query.with_for_update(read=lock == 'share')
+    value = connection.execute(query).scalar()
+    if value is None:
+        value = datetime.now()
+        connection.execute(clock.insert().values(id=1, counted_at=value))
+    return value
+
+
+def adjust_counts(connection, shows, sign=1):
+    # adds (sign=-1: removes) shows, as (date, venue_id, artist_id), to the
+    # counters, with one UPDATE per entity touched
+    shows = [show for show in shows if show[0] is not None]
+    if not shows:
+        return
+    split = counted_at(connection, lock='share')
+    for table, key in COUNTED:
+        index = 1 if key == 'venue_id' else 2
+        counts = Counter((show[index], show[0] > split) for show in shows)
+        rows = [{'entity_id': id, 'upcoming': sign * n if upcoming else 0,
+                 'past': 0 if upcoming else sign * n}
+                for (id, upcoming), n in counts.items()]
+        connection.execute(
+            table.update().where(table.c.id == bindparam('entity_id')).values(
+                upcoming_show_count=table.c.upcoming_show_count + bindparam('upcoming'),
+                past_show_count=table.c.past_show_count + bindparam('past')),
+            rows)
+        if key == 'venue_id':
+            refresh_venue_areas(connection, {row['entity_id'] for row in rows})
+
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+    adjust_counts(connection, [(show.date, show.venue_id, show.artist_id)])
+
+
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, show):
+    adjust_counts(connection, [(show.date, show.venue_id, show.artist_id)], -1)
+
+
+def roll_show_counts(now=None):
+    # moves shows that started between the clock and now from upcoming to
+    # past; returns how many moved. The caller commits.
+    if now is None:
+        now = datetime.now()
+    connection = db.session.connection()
+    split = counted_at(connection, lock='update')
+    if now <= split:
+        return 0
+    moved = 0
+    for table, key in COUNTED:
+        column = getattr(Show, key)
+        started = db.session.query(column, db.func.count(Show.id)).filter(
+            Show.date > split, Show.date <= now).group_by(column).all()
+        if started:
+            connection.execute(
+                table.update().where(table.c.id == bindparam('entity_id')).values(
+                    upcoming_show_count=table.c.upcoming_show_count - bindparam('n'),
+                    past_show_count=table.c.past_show_count + bindparam('n')),
+                [{'entity_id': id, 'n': n} for id, n in started])
+            # the same shows either way round
+            moved = sum(n for _, n in started)
+            if key == 'venue_id':
+                refresh_venue_areas(connection, {id for id, _ in started})
+    connection.execute(clock.update().where(clock.c.id == 1).values(counted_at=now))
+    return moved
+
+
+def rebuild_show_counts(now=None):
+    # recounts every venue and artist from the show table
+    if now is None:
+        now = datetime.now()
+    connection = db.session.connection()
+    counted_at(connection, lock='update')
+    for table, key in COUNTED:
+        column = getattr(Show, key)
+
+        def count(*criteria):
+            return db.select([db.func.count(Show.id)]).where(
+                column == table.c.id).where(*criteria).scalar_subquery()
+        connection.execute(table.update().values(
+            upcoming_show_count=count(Show.date > now),
+            past_show_count=count(Show.date <= now)))
+    connection.execute(clock.update().where(clock.c.id == 1).values(counted_at=now))
+    rebuild_areas(connection)
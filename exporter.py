@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+from forms import DATETIME_FORMAT
+from models import db, Venue, Artist, Show
+from queries import filter_genre
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+# named after the form fields, so an export imports back as it is
+EXPORT_COLUMNS = {
+    'venues': [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+               Venue.phone, Venue.genres, Venue.facebook_link, Venue.image_link,
+               Venue.website_link, Venue.searching_talent.label('seeking_talent'),
+               Venue.search_description.label('seeking_description')],
+    'artists': [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+                Artist.genres, Artist.facebook_link, Artist.image_link,
+                Artist.website_link, Artist.searching_venues.label('seeking_venue'),
+                Artist.search_description.label('seeking_description')],
+    'shows': [Show.id, Show.date.label('start_time'), Show.venue_id, Show.artist_id],
+}
+
+
+def export_query(entity, since=None, until=None, city=None, state=None, genre=None):
+    # venues/artists filter on their own city, state and genre; shows filter
+    # on their date, their venue's city/state and their artist's genre
+    query = db.session.query(*EXPORT_COLUMNS[entity])
+    if entity == 'shows':
+        if since is not None:
+            query = query.filter(Show.date >= since)
+        if until is not None:
+            query = query.filter(Show.date < until)
+        if city or state:
+            query = query.join(Venue, Show.venue_id == Venue.id)
+        if genre:
+            query = filter_genre(
+                query.join(Artist, Show.artist_id == Artist.id), Artist, genre)
+        model = Venue
+    else:
+        model = Venue if entity == 'venues' else Artist
+        if genre:
+            query = filter_genre(query, model, genre)
+    if city:
+        query = query.filter(model.city == city)
+    if state:
+        query = query.filter(model.state == state)
+    return query.order_by(EXPORT_COLUMNS[entity][0])
+
+
+def export_rows(entity, batch_size=1000, **filters):
+    # rows come from a server-side cursor batch_size at a time, so memory
+    # stays flat whatever the table size. Dates are written the way the
+    # show form takes them.
+    for row in export_query(entity, **filters).yield_per(batch_size):
+        row = row._asdict()
+        if entity == 'shows' and row['start_time'] is not None:
+            row['start_time'] = row['start_time'].strftime(DATETIME_FORMAT)
+        yield row
+
+
+def encode(rows, format, fields, batch_size=1000):
+    # encodes rows as JSON lines or CSV, yielding one text chunk per batch
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(row, default=str))
+            buffer.write('\n')
+    for count, row in enumerate(rows, start=1):
+        write(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(entity, format='jsonl', gzip=False, **filters):
+    fields = [column.key for column in EXPORT_COLUMNS[entity]]
+    chunks = encode(export_rows(entity, **filters), format, fields)
+    if gzip:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
@@ -4,6 +4,9 @@ from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
 from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Length
 import re
 
+# how start_time is posted, and how exports write it
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
 
 def validate_phone(self, phone):
     if not re.findall(r"\+?[\d]{3}-[\d]{3}-[\d]{4}", phone.data):
@@ -20,7 +23,8 @@ class ShowForm(Form):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default=datetime.today()
+        default=datetime.today(),
+        format=DATETIME_FORMAT
     )
 
 
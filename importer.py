@@ -0,0 +1,236 @@
+import csv
+import json
+import time
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm, DATETIME_FORMAT
+from models import db, Venue, Artist, Show, Genre
+from counters import adjust_counts
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+
+def read_rows(path, format=None):
+    # streams (line number, row dict) pairs from a CSV or JSON-lines file. A
+    # line that is not valid JSON comes through as its raw text, for the
+    # importer to reject.
+    if format is None:
+        format = 'csv' if path.endswith('.csv') else 'jsonl'
+    with open(path, newline='') as f:
+        if format == 'csv':
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                yield number, row
+        else:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        row = line.rstrip('\n')
+                    yield number, row
+
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+# CSV has no booleans; these strings (any case) mean false
+FALSE_STRINGS = ('', 'false', '0', 'no', 'n', 'off')
+
+
+def form_data(row):
+    # MultiDict as a browser would post it: genres as repeated values,
+    # booleans present only when true, start_time in the form's format
+    # (ISO 8601 times, as /api/v1 writes them, are accepted too)
+    data = MultiDict()
+    for key in BOOLEAN_FIELDS:
+        if isinstance(row.get(key), str):
+            row = dict(row, **{key: row[key].strip().lower() not in FALSE_STRINGS})
+    for key, value in row.items():
+        if value is None or value is False:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre.strip() for genre in value.split(',')]
+            for genre in value:
+                data.add(key, genre)
+        elif value is True:
+            data.add(key, 'y')
+        elif key == 'start_time' and isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value.strip()).strftime(DATETIME_FORMAT)
+            except ValueError:
+                pass  # left for the form to reject
+            data.add(key, value)
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def venue_values(form):
+    return dict(
+        name=form.name.data,
+        city=form.city.data,
+        state=form.state.data,
+        address=form.address.data,
+        phone=form.phone.data,
+        genres=','.join(dict.fromkeys(form.genres.data)),
+        facebook_link=form.facebook_link.data,
+        image_link=form.image_link.data,
+        website_link=form.website_link.data,
+        searching_talent=form.seeking_talent.data,
+        search_description=form.seeking_description.data
+    )
+
+
+def artist_values(form):
+    return dict(
+        name=form.name.data,
+        city=form.city.data,
+        state=form.state.data,
+        phone=form.phone.data,
+        genres=','.join(dict.fromkeys(form.genres.data)),
+        facebook_link=form.facebook_link.data,
+        image_link=form.image_link.data,
+        website_link=form.website_link.data,
+        searching_venues=form.seeking_venue.data,
+        search_description=form.seeking_description.data
+    )
+
+
+def show_values(form):
+    return dict(
+        date=form.start_time.data,
+        venue_id=int(form.venue_id.data),
+        artist_id=int(form.artist_id.data)
+    )
+
+
+class Importer(object):
+    # validates rows with the entity's form and inserts them in batches,
+    # committing once per batch and collecting rejected rows.
+
+    def __init__(self, entity, batch_size=1000):
+        self.entity = entity
+        self.batch_size = batch_size
+        self.form = {
+            'venues': VenueForm, 'artists': ArtistForm, 'shows': ShowForm
+        }[entity](formdata=None, meta={'csrf': False})
+        self.values = {
+            'venues': venue_values, 'artists': artist_values, 'shows': show_values
+        }[entity]
+        self.imported = 0
+        self.rejected = []
+        # (kind, id) page cache keys whose data the import changed
+        self.touched = {('venues', 'directory')}
+
+    def validate(self, number, row):
+        if not isinstance(row, dict):
+            self.rejected.append((number, {'row': ['Not a JSON object']}, row))
+            return None
+        self.form.process(form_data(row))
+        if not self.form.validate():
+            self.rejected.append((number, self.form.errors, row))
+            return None
+        if self.entity == 'shows' and not (
+                self.form.venue_id.data.isdigit() and self.form.artist_id.data.isdigit()):
+            self.rejected.append((number, {'id': ['venue_id and artist_id must be numbers']}, row))
+            return None
+        return self.values(self.form)
+
+    def run(self, rows):
+        batch = []
+        for number, row in rows:
+            values = self.validate(number, row)
+            if values is not None:
+                batch.append((number, row, values))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+    def flush(self, batch):
+        if self.entity == 'shows':
+            batch = self.check_show_references(batch)
+            if not batch:
+                return
+        # a batch the database refuses is rolled back and rejected as a
+        # whole; earlier and later batches still go in
+        try:
+            touched = self.insert(batch)
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            message = str(getattr(error, 'orig', None) or error)
+            self.rejected.extend((number, {'batch': [message]}, row)
+                                 for number, row, _ in batch)
+            return
+        self.imported += len(batch)
+        self.touched.update(touched)
+
+    def insert(self, batch):
+        # adds the batch to the session; returns the page cache keys it
+        # touches
+        touched = set()
+        if self.entity == 'shows':
+            # shows need no generated ids back, so they go through one
+            # executemany per batch
+            db.session.execute(Show.__table__.insert(),
+                               [values for _, _, values in batch])
+            # core inserts skip the ORM events keeping the counters
+            adjust_counts(db.session.connection(), [
+                (values['date'], values['venue_id'], values['artist_id'])
+                for _, _, values in batch])
+            for _, _, values in batch:
+                touched.add(('venue', values['venue_id']))
+                touched.add(('artist', values['artist_id']))
+        else:
+            model = Venue if self.entity == 'venues' else Artist
+            genres = {genre.name: genre for genre in Genre.for_names(
+                sorted({name for _, _, values in batch
+                        for name in values['genres'].split(',')}))}
+            db.session.add_all([
+                model(genre_tags=[genres[name] for name in values['genres'].split(',')],
+                      **values)
+                for _, _, values in batch
+            ])
+        return touched
+
+    def check_show_references(self, batch):
+        # rejects shows pointing at venues/artists that do not exist instead
+        # of failing the whole batch on the foreign key
+        venue_ids = {values['venue_id'] for _, _, values in batch}
+        artist_ids = {values['artist_id'] for _, _, values in batch}
+        venue_ids = {id for (id,) in db.session.query(Venue.id).filter(
+            Venue.id.in_(venue_ids))}
+        artist_ids = {id for (id,) in db.session.query(Artist.id).filter(
+            Artist.id.in_(artist_ids))}
+        valid = []
+        for number, row, values in batch:
+            if values['venue_id'] not in venue_ids:
+                self.rejected.append((number, {'venue_id': ['Unknown venue']}, row))
+            elif values['artist_id'] not in artist_ids:
+                self.rejected.append((number, {'artist_id': ['Unknown artist']}, row))
+            else:
+                valid.append((number, row, values))
+        return valid
+
+    def write_rejects(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['line', 'errors', 'row'])
+            for number, errors, row in self.rejected:
+                writer.writerow([number, json.dumps(errors),
+                                 json.dumps(row, default=str)])
+
+
+def import_file(entity, path, format=None, batch_size=1000, rejects=None):
+    importer = Importer(entity, batch_size)
+    started = time.perf_counter()
+    try:
+        importer.run(read_rows(path, format))
+    finally:
+        if importer.rejected:
+            importer.write_rejects(rejects or path + '.rejects.csv')
+    return importer, time.perf_counter() - started
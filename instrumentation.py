@@ -0,0 +1,637 @@
+import atexit
+import bisect
+import json
+import logging
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, render_template, request
+from flask.logging import default_handler
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+pool_logger = logging.getLogger('fyyur.pool')
+
+# upper bounds, in milliseconds, of the checkout wait histogram buckets
+WAIT_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, float('inf')]
+
+
+class PoolMonitor(object):
+    # counts pool events and buckets how long checkouts waited for a
+    # connection, logging slow checkouts and timeouts.
+
+    def __init__(self, slow_checkout_ms=100):
+        self.slow_checkout_ms = slow_checkout_ms
+        self.wait_counts = [0] * len(WAIT_BUCKETS)
+        self.wait_total_ms = 0.0
+        self.events = dict.fromkeys(
+            ['connect', 'checkout', 'checkin', 'invalidate', 'timeout'], 0)
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.events[name] += 1
+
+    def record_wait(self, pool, wait_ms):
+        with self._lock:
+            self.wait_counts[bisect.bisect_left(WAIT_BUCKETS, wait_ms)] += 1
+            self.wait_total_ms += wait_ms
+        if wait_ms >= self.slow_checkout_ms:
+            pool_logger.warning('slow connection checkout: waited %.1fms, %s',
+                                wait_ms, pool.status())
+
+    def listen(self, target):
+        # target is an engine, a pool or a pool class
+        def on_connect(dbapi_connection, connection_record):
+            self.count('connect')
+            pool_logger.info('new database connection opened')
+
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.count('invalidate')
+            pool_logger.warning('connection invalidated: %s', exception)
+
+        event.listen(target, 'connect', on_connect)
+        event.listen(target, 'checkout', lambda *args: self.count('checkout'))
+        event.listen(target, 'checkin', lambda *args: self.count('checkin'))
+        event.listen(target, 'invalidate', on_invalidate)
+
+    def stats(self, pool):
+        with self._lock:
+            histogram = dict(zip([str(bound) for bound in WAIT_BUCKETS],
+                                 self.wait_counts))
+            waits = sum(self.wait_counts)
+            stats = {
+                "events": dict(self.events),
+                "wait_ms": {
+                    "count": waits,
+                    "mean": self.wait_total_ms / waits if waits else 0,
+                    "buckets": histogram,
+                },
+            }
+        stats["pool"] = pool.__class__.__name__
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        return stats
+
+
+pool_monitor = PoolMonitor()
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that reports how long each checkout waited to pool_monitor
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self).connect()
+        except Exception as e:
+            if e.__class__.__name__ == 'TimeoutError':
+                pool_monitor.count('timeout')
+                pool_logger.error('connection checkout timed out: %s', self.status())
+            raise
+        finally:
+            pool_monitor.record_wait(
+                self, (time.perf_counter() - started) * 1000)
+
+
+pool_monitor.listen(TimedQueuePool)
+
+
+#----------------------------------------------------------------------------#
+# Per-request SQL profiling.
+#----------------------------------------------------------------------------#
+
+sql_logger = logging.getLogger('fyyur.sql')
+
+FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+class RepeatedQueryError(Exception):
+    pass
+
+
+def fingerprint(statement):
+    # statement shape: literals and IN lists collapsed, whitespace squeezed
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestProfile(object):
+    # queries run, and time spent rendering templates, while handling one
+    # request
+
+    def __init__(self, keep=100):
+        self.count = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.shapes = Counter()
+        self.queries = []
+        self.keep = keep
+        self.started = time.perf_counter()
+
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.db_ms += elapsed_ms
+        self.shapes[fingerprint(statement)] += 1
+        if len(self.queries) < self.keep:
+            self.queries.append((statement, elapsed_ms))
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count > threshold]
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        return ('db;dur={:.1f};desc="{} queries", render;dur={:.1f}, '
+                'app;dur={:.1f}').format(
+            self.db_ms, self.count, self.render_ms,
+            self.elapsed_ms() - self.db_ms - self.render_ms)
+
+
+def current_profile():
+    return g.get('sql_profile') if has_request_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    profile = current_profile()
+    if profile is not None:
+        profile.record(statement, (time.perf_counter() - started) * 1000)
+
+
+def handle_error(context):
+    # a failed statement gets no after_cursor_execute; drop its start time
+    # so it does not stay on the pooled connection
+    connection = context.connection
+    if connection is not None and connection.info.get('query_started'):
+        started = connection.info['query_started'].pop()
+        profile = current_profile()
+        if profile is not None and context.statement is not None:
+            profile.record(context.statement, (time.perf_counter() - started) * 1000)
+
+
+class SQLProfiler(object):
+    # records every statement run during a request (on any engine), adds a
+    # Server-Timing header, and warns about statement shapes repeated more
+    # than SQL_REPEAT_THRESHOLD times: the signature of an N+1 loop.
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.threshold = app.config.get('SQL_REPEAT_THRESHOLD', 5)
+        self.raise_on_repeat = app.config.get('SQL_REPEAT_RAISE', False)
+        self.panel = app.debug and app.config.get('SQL_PROFILER_PANEL', False)
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self):
+        g.sql_profile = RequestProfile()
+
+    def after_request(self, response):
+        profile = g.get('sql_profile')
+        if profile is None:
+            return response
+        # streamed responses keep querying after this point, so their
+        # header only covers the queries run before the first chunk
+        response.headers.add('Server-Timing', profile.server_timing())
+        repeated = profile.repeated(self.threshold)
+        for shape, count in repeated:
+            sql_logger.warning('%s %s ran %s x %d', request.method,
+                               request.path, shape, count)
+        if repeated and self.raise_on_repeat:
+            raise RepeatedQueryError('{} {}: {} x {}'.format(
+                request.method, request.path, *repeated[0]))
+        if (self.panel and not response.is_streamed
+                and response.mimetype == 'text/html'):
+            self.inject_panel(response, profile, repeated)
+        return response
+
+    def inject_panel(self, response, profile, repeated):
+        panel = render_template('debug/sql_panel.html', profile=profile,
+                                repeated=repeated, threshold=self.threshold)
+        body = response.get_data(as_text=True)
+        if '</body>' in body:
+            body = body.replace('</body>', panel + '</body>', 1)
+            response.set_data(body)
+
+
+#----------------------------------------------------------------------------#
+# Templates.
+#----------------------------------------------------------------------------#
+
+template_logger = logging.getLogger('fyyur.templates')
+
+
+def record_render(name, elapsed_ms):
+    # a page's time includes the layouts it extends and the templates it
+    # includes, which are rendered as part of it
+    profile = current_profile()
+    if profile is not None:
+        profile.render_ms += elapsed_ms
+    counters.observe('fyyur_template_render_seconds', (('template', name),),
+                     elapsed_ms / 1000, LATENCY_BUCKETS)
+
+
+class TimedTemplate(Template):
+    # records how long each render, or each streamed render, takes
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+            record_render(self.name, (time.perf_counter() - started) * 1000)
+
+    def generate(self, *args, **kwargs):
+        # only the time spent producing chunks counts, not the time the
+        # server spends sending them
+        chunks = super(TimedTemplate, self).generate(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield chunk
+        finally:
+            record_render(self.name, elapsed * 1000)
+
+
+def timed_environment(base):
+    # base (Flask's jinja Environment class) building TimedTemplates
+    return type('TimedEnvironment', (base,), {'template_class': TimedTemplate})
+
+
+def warm_templates(env, extensions=('.html',)):
+    # compiles every template up front, so no request pays for it; with a
+    # bytecode cache on the environment, later workers load the compiled
+    # code instead of compiling again
+    started = time.perf_counter()
+    names = env.list_templates(extensions=[ext.lstrip('.') for ext in extensions])
+    for name in names:
+        env.get_template(name)
+    template_logger.info('compiled %d templates in %.1fms', len(names),
+                         (time.perf_counter() - started) * 1000)
+    return names
+
+
+def template_stats():
+    # per template render count and time, slowest in total first
+    totals = counters.collect()
+    stats = {}
+    for (name, labels, _), value in totals.items():
+        if not name.startswith('fyyur_template_render_seconds_'):
+            continue
+        template = dict(labels)['template']
+        entry = stats.setdefault(template, {"template": template})
+        if name.endswith('_sum'):
+            entry["total_ms"] = value * 1000
+        elif name.endswith('_count'):
+            entry["count"] = int(value)
+    for entry in stats.values():
+        entry["mean_ms"] = entry["total_ms"] / entry["count"]
+    return sorted(stats.values(), key=lambda entry: -entry["total_ms"])
+
+
+#----------------------------------------------------------------------------#
+# Route metrics.
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+METRICS = [
+    # name, type, help, buckets
+    ('fyyur_requests_total', 'counter', 'Requests handled.', None),
+    ('fyyur_requests_in_flight', 'gauge', 'Requests being handled.', None),
+    ('fyyur_request_duration_seconds', 'histogram',
+     'Time from the start of the request to the last byte sent.', LATENCY_BUCKETS),
+    ('fyyur_request_db_seconds', 'histogram',
+     'Time spent running SQL statements per request.', LATENCY_BUCKETS),
+    ('fyyur_request_render_seconds', 'histogram',
+     'Time spent rendering templates per request.', LATENCY_BUCKETS),
+    ('fyyur_response_size_bytes', 'histogram',
+     'Response body size.', SIZE_BUCKETS),
+    ('fyyur_template_render_seconds', 'histogram',
+     'Time spent rendering each page template.', LATENCY_BUCKETS),
+    ('fyyur_log_records_dropped_total', 'counter',
+     'Log records dropped because the log queue was full.', None),
+]
+
+
+class ShardedCounters(object):
+    # counters summed across per-thread shards: each thread only ever
+    # updates its own dict, so the request path takes no lock. Shards of
+    # threads that have exited are folded into one whenever a new thread
+    # registers or on collect, so a thread-per-request server keeps one
+    # shard per live thread.
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = defaultdict(float)
+            with self._lock:
+                self._retire()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire(self):
+        # caller holds the lock
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in list(shard.items()):
+                    self._retired[key] += value
+        self._shards = live
+
+    def inc(self, key, amount=1):
+        self.shard()[key] += amount
+
+    def observe(self, name, labels, value, buckets):
+        shard = self.shard()
+        shard[(name + '_bucket', labels, bisect.bisect_left(buckets, value))] += 1
+        shard[(name + '_sum', labels, None)] += value
+        shard[(name + '_count', labels, None)] += 1
+
+    def collect(self):
+        with self._lock:
+            self._retire()
+            totals = defaultdict(float, self._retired)
+            for _, shard in self._shards:
+                for key, value in list(shard.items()):
+                    totals[key] += value
+        return totals
+
+
+counters = ShardedCounters()
+
+
+def format_labels(labels, le=None):
+    pairs = list(labels)
+    if le is not None:
+        pairs.append(('le', le))
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(
+        key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in pairs) + '}'
+
+
+def format_value(value):
+    return repr(int(value)) if value == int(value) else repr(value)
+
+
+class RouteMetrics(object):
+    # per-endpoint request counts, in-flight requests, latency, DB time,
+    # render time and response size histograms, in the Prometheus text
+    # exposition format. DB and render times come from the SQLProfiler's
+    # request profile.
+
+    def __init__(self, app=None):
+        self.counters = counters
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_labels = (('endpoint', request.endpoint or 'unmatched'),
+                            ('method', request.method))
+        self.counters.inc(('fyyur_requests_in_flight', g.metrics_labels, None))
+
+    def after_request(self, response):
+        # recorded once the response is closed, so streamed responses count
+        # their full duration and size
+        labels = g.get('metrics_labels')
+        if labels is None:
+            return response
+        started = g.metrics_started
+        profile = g.get('sql_profile')
+        if response.direct_passthrough:
+            # files are handed to the server as they are and never closed
+            # through the response, so they are recorded here
+            self.finish(labels, response.status_code, started, profile,
+                        response.content_length or 0)
+            return response
+        if response.is_streamed:
+            sizes = [0]
+
+            def counted(chunks):
+                for chunk in chunks:
+                    sizes[0] += len(chunk)
+                    yield chunk
+            response.response = counted(response.response)
+        else:
+            sizes = [response.content_length or 0]
+
+        def finish():
+            self.finish(labels, response.status_code, started, profile, sizes[0])
+        response.call_on_close(finish)
+        return response
+
+    def finish(self, labels, status, started, profile, size):
+        counters = self.counters
+        counters.inc(('fyyur_requests_in_flight', labels, None), -1)
+        counters.inc(('fyyur_requests_total', labels + (('status', status),), None))
+        counters.observe('fyyur_request_duration_seconds', labels,
+                         time.perf_counter() - started, LATENCY_BUCKETS)
+        if profile is not None:
+            counters.observe('fyyur_request_db_seconds', labels,
+                             profile.db_ms / 1000, LATENCY_BUCKETS)
+            counters.observe('fyyur_request_render_seconds', labels,
+                             profile.render_ms / 1000, LATENCY_BUCKETS)
+        counters.observe('fyyur_response_size_bytes', labels, size, SIZE_BUCKETS)
+
+    def exposition(self):
+        totals = self.counters.collect()
+        by_name = defaultdict(dict)
+        for (name, labels, bucket), value in totals.items():
+            by_name[name][(labels, bucket)] = value
+        lines = []
+        for name, kind, help, buckets in METRICS:
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            if buckets is None:
+                for (labels, _), value in sorted(by_name[name].items()):
+                    lines.append('{}{} {}'.format(
+                        name, format_labels(labels), format_value(value)))
+                continue
+            counts = by_name[name + '_bucket']
+            for labels in sorted({labels for labels, _ in counts}):
+                cumulative = 0
+                for index, bound in enumerate(buckets + ['+Inf']):
+                    cumulative += counts.get((labels, index), 0)
+                    lines.append('{}_bucket{} {}'.format(
+                        name, format_labels(labels, bound), format_value(cumulative)))
+                for suffix in ('_sum', '_count'):
+                    lines.append('{}{}{} {}'.format(
+                        name, suffix, format_labels(labels),
+                        format_value(by_name[name + suffix][(labels, None)])))
+        return '\n'.join(lines) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+# record attributes copied into the JSON line when present
+CONTEXT_FIELDS = ['request_id', 'method', 'path', 'endpoint', 'status',
+                  'elapsed_ms', 'db_ms', 'queries', 'render_ms', 'size']
+
+
+class DroppingQueueHandler(QueueHandler):
+    # hands records to a bounded queue without ever blocking: when the
+    # writer falls behind, records are dropped and counted instead. The
+    # request context is captured here, on the request thread.
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            counters.inc(('fyyur_log_records_dropped_total', (), None))
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        if has_request_context():
+            profile = g.get('sql_profile')
+            context = {
+                'request_id': g.get('request_id'),
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+            }
+            if profile is not None:
+                context.update(elapsed_ms=round(profile.elapsed_ms(), 1),
+                               db_ms=round(profile.db_ms, 1),
+                               queries=profile.count,
+                               render_ms=round(profile.render_ms, 1))
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def access_record(response):
+    # one INFO record per request, written once the response is closed so
+    # streamed responses report their full time
+    logger = logging.getLogger('fyyur.access')
+    profile = g.get('sql_profile')
+    fields = {
+        'request_id': g.get('request_id'),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+    }
+
+    def log():
+        extra = dict(fields, size=response.content_length)
+        if profile is not None:
+            extra.update(elapsed_ms=round(profile.elapsed_ms(), 1),
+                         db_ms=round(profile.db_ms, 1), queries=profile.count,
+                         render_ms=round(profile.render_ms, 1))
+        logger.info('%s %s %s', fields['method'], fields['path'],
+                    fields['status'], extra=extra)
+    response.call_on_close(log)
+
+
+def init_logging(app, path, level=logging.INFO, max_bytes=10485760,
+                 backup_count=5, queue_size=10000):
+    # routes app.logger and the fyyur.* loggers through a bounded queue to
+    # a background thread writing rotated JSON-lines files. Every request
+    # gets an id, taken from X-Request-ID when the client sends one. Flask's
+    # default stderr handler, attached when app.logger is first touched, is
+    # removed and nothing propagates to the root logger, so no record is
+    # written synchronously on the request thread.
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                       backupCount=backup_count)
+    file_handler.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(queue_size)
+    listener = QueueListener(log_queue, file_handler)
+    queue_handler = DroppingQueueHandler(log_queue)
+    for logger in (app.logger, logging.getLogger('fyyur')):
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+    app.logger.removeHandler(default_handler)
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    @app.after_request
+    def log_request(response):
+        response.headers['X-Request-ID'] = g.request_id
+        access_record(response)
+        return response
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,29 @@
+"""add trigram name indexes
+
+Revision ID: a83f0d6e41c7
+Revises: 5c1e7a92b3d4
+Create Date: 2026-10-18 11:40:07.532816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83f0d6e41c7'
+down_revision = '5c1e7a92b3d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
@@ -0,0 +1,59 @@
+"""add venue/artist show counters
+
+Revision ID: b61f0e3d9a47
+Revises: 7d3a5f1c2e88
+Create Date: 2026-10-18 16:12:07.518630
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b61f0e3d9a47'
+down_revision = '7d3a5f1c2e88'
+branch_labels = None
+depends_on = None
+
+show = sa.table('show', sa.column('id', sa.Integer), sa.column('date', sa.DateTime),
+                sa.column('venue_id', sa.Integer), sa.column('artist_id', sa.Integer))
+
+
+def upgrade():
+    op.create_table('show_count_clock',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('counted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('artist', sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artist', sa.Column('past_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('venue', sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('venue', sa.Column('past_show_count', sa.Integer(), server_default='0', nullable=False))
+
+    # count every existing show as of now; shows written later keep the
+    # counters up to date themselves
+    now = datetime.now()
+    connection = op.get_bind()
+    connection.execute(sa.table(
+        'show_count_clock', sa.column('id', sa.Integer), sa.column('counted_at', sa.DateTime)
+    ).insert().values(id=1, counted_at=now))
+    for table_name, key_name in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        table = sa.table(table_name, sa.column('id', sa.Integer),
+                         sa.column('upcoming_show_count', sa.Integer),
+                         sa.column('past_show_count', sa.Integer))
+
+        def count(criterion):
+            return sa.select([sa.func.count(show.c.id)]).where(
+                show.c[key_name] == table.c.id).where(criterion).scalar_subquery()
+        connection.execute(table.update().values(
+            upcoming_show_count=count(show.c.date > now),
+            past_show_count=count(show.c.date <= now)))
+
+
+def downgrade():
+    op.drop_column('venue', 'past_show_count')
+    op.drop_column('venue', 'upcoming_show_count')
+    op.drop_column('artist', 'past_show_count')
+    op.drop_column('artist', 'upcoming_show_count')
+    op.drop_table('show_count_clock')
@@ -0,0 +1,52 @@
+"""materialise the venue directory areas
+
+Revision ID: c3d8e5a1f260
+Revises: b61f0e3d9a47
+Create Date: 2026-10-18 16:48:31.220914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8e5a1f260'
+down_revision = 'b61f0e3d9a47'
+branch_labels = None
+depends_on = None
+
+venue = sa.table('venue', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                 sa.column('city', sa.String), sa.column('state', sa.String),
+                 sa.column('upcoming_show_count', sa.Integer))
+
+
+def upgrade():
+    venue_area = op.create_table('venue_area',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('venues', sa.JSON(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('state', 'city', name='uq_venue_area_state_city')
+    )
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city'], unique=False)
+
+    # one pass over the venues in area order
+    areas = {}
+    rows = op.get_bind().execute(
+        sa.select([venue.c.id, venue.c.name, venue.c.city, venue.c.state,
+                   venue.c.upcoming_show_count])
+        .order_by(venue.c.state, venue.c.city, venue.c.name, venue.c.id))
+    for row in rows:
+        areas.setdefault((row.city, row.state), []).append({
+            'id': row.id, 'name': row.name,
+            'upcoming_show_count': row.upcoming_show_count})
+    if areas:
+        op.bulk_insert(venue_area, [
+            {'city': city, 'state': state, 'venues': venues}
+            for (city, state), venues in areas.items()])
+
+
+def downgrade():
+    op.drop_index('ix_venue_state_city', table_name='venue')
+    op.drop_table('venue_area')
@@ -0,0 +1,122 @@
+"""normalise genres into genre association tables
+
+Revision ID: e4b2c9d07a15
+Revises: a83f0d6e41c7
+Create Date: 2026-10-18 13:05:22.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b2c9d07a15'
+down_revision = 'a83f0d6e41c7'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+genre = sa.table('genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def upgrade():
+    op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('venue_genre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genre_genre_id', 'venue_genre', ['genre_id', 'venue_id'], unique=False)
+    op.create_table('artist_genre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genre_genre_id', 'artist_genre', ['genre_id', 'artist_id'], unique=False)
+    op.alter_column('venue', 'genres',
+               existing_type=sa.VARCHAR(length=120),
+               type_=sa.Text(),
+               existing_nullable=False)
+    op.alter_column('artist', 'genres',
+               existing_type=sa.VARCHAR(length=120),
+               type_=sa.Text(),
+               existing_nullable=False)
+
+    # backfill outside the DDL transaction, one committed batch at a time,
+    # so venue/artist writes are never blocked for the whole table. the
+    # backfill skips links that already exist and can be re-run.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        backfill(connection, 'venue', 'venue_genre', 'venue_id')
+        backfill(connection, 'artist', 'artist_genre', 'artist_id')
+
+
+def backfill(connection, table_name, association_name, key_name):
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column('genres', sa.Text))
+    association = sa.table(association_name, sa.column(key_name, sa.Integer),
+                           sa.column('genre_id', sa.Integer))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([table.c.id, table.c.genres]).where(table.c.id > last_id)
+            .order_by(table.c.id).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        names_by_id = {
+            row.id: {name.strip() for name in (row.genres or '').split(',') if name.strip()}
+            for row in rows
+        }
+        names = set().union(*names_by_id.values())
+        genre_ids = genre_ids_for(connection, names)
+
+        existing = set(connection.execute(
+            sa.select([association.c[key_name], association.c.genre_id])
+            .where(association.c[key_name].in_(list(names_by_id)))).fetchall())
+        links = [
+            {key_name: id, 'genre_id': genre_ids[name]}
+            for id, names in names_by_id.items() for name in names
+            if (id, genre_ids[name]) not in existing
+        ]
+        if links:
+            connection.execute(association.insert(), links)
+
+
+def genre_ids_for(connection, names):
+    if not names:
+        return {}
+    found = dict(connection.execute(
+        sa.select([genre.c.name, genre.c.id]).where(genre.c.name.in_(names))).fetchall())
+    missing = [{'name': name} for name in names if name not in found]
+    if missing:
+        connection.execute(genre.insert(), missing)
+        found.update(connection.execute(
+            sa.select([genre.c.name, genre.c.id]).where(genre.c.name.in_(names))).fetchall())
+    return found
+
+
+def downgrade():
+    op.alter_column('artist', 'genres',
+               existing_type=sa.Text(),
+               type_=sa.VARCHAR(length=120),
+               existing_nullable=False)
+    op.alter_column('venue', 'genres',
+               existing_type=sa.Text(),
+               type_=sa.VARCHAR(length=120),
+               existing_nullable=False)
+    op.drop_index('ix_artist_genre_genre_id', table_name='artist_genre')
+    op.drop_table('artist_genre')
+    op.drop_index('ix_venue_genre_genre_id', table_name='venue_genre')
+    op.drop_table('venue_genre')
+    op.drop_table('genre')
@@ -2,29 +2,90 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_moment import Moment
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 
+def row_version():
+    # row version, bumped in every UPDATE of the row; feeds the API ETags.
+    # Not a version_id_col: overlapping edits both apply, last write wins.
+    return db.Column(db.Integer, nullable=False, server_default='1',
+                     onupdate=db.text('version + 1'))
+
+
+venue_genre = db.Table(
+    'venue_genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey(
+        'venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey(
+        'genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genre_genre_id', 'genre_id', 'venue_id')
+)
+
+artist_genre = db.Table(
+    'artist_genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey(
+        'artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey(
+        'genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genre_genre_id', 'genre_id', 'artist_id')
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def for_names(cls, names):
+        # existing genres by name, creating any that are missing; repeated
+        # names give one genre
+        names = list(dict.fromkeys(names))
+        existing = {genre.name: genre for genre in cls.query.filter(
+            cls.name.in_(names))}
+        return [existing.get(name) or cls(name=name) for name in names]
+
+    def __repr__(self):
+        return f'<Genre genre_id: {self.id} genre_name: {self.name}>'
+
+
 class Venue(db.Model):
     __tablename__ = 'venue'
+    # trigram index backing the substring search on name; venue_area
+    # refreshes look venues up by state and city
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_state_city', 'state', 'city'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.Integer, nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    # legacy comma-joined copy of genre_tags, kept in sync on write
+    genres = db.Column(db.Text, nullable=False)
     facebook_link = db.Column(db.String(120))
     image_link = db.Column(db.String(500), nullable=False)
     website_link = db.Column(db.String(120))
     searching_talent = db.Column(db.Boolean, default=False)
     search_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venue', lazy=False)
+    shows = db.relationship('Show', backref='venue', lazy='select')
+    genre_tags = db.relationship('Genre', secondary=venue_genre, lazy='select',
+                                 order_by='Genre.name')
+    # shows counted as upcoming/past as of show_count_clock.counted_at,
+    # maintained on write by counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    version = row_version()
 
     def __repr__(self):
         f'<Venue venue_id: {self.id} venue_name: {self.name} venue_city: {self.city} venue_state: {self.state} venue_address: {self.address} venue_phone: {self.phone} venue_facebook: {self.facebook_link} venue_image: {self.image_link} venue_website: {self.website_link} venue_searching: {self.searching_talent} venue_description: {self.search_description} shows: {self.shows}>'
@@ -32,19 +93,32 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    # trigram index backing the substring search on name
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.Integer, nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    # legacy comma-joined copy of genre_tags, kept in sync on write
+    genres = db.Column(db.Text, nullable=False)
     image_link = db.Column(db.String(500), nullable=False)
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     searching_venues = db.Column(db.Boolean, default=False)
     search_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artist', lazy=False)
+    shows = db.relationship('Show', backref='artist', lazy='select')
+    genre_tags = db.relationship('Genre', secondary=artist_genre, lazy='select',
+                                 order_by='Genre.name')
+    # shows counted as upcoming/past as of show_count_clock.counted_at,
+    # maintained on write by counters.py
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    version = row_version()
 
     def __repr__(self):
         f'<Artist artist_id: {self.id} artist_name: {self.name} artist_city: {self.city} artist_state: {self.state} artist_phone: {self.phone} artist_genres: {self.genres} artist_facebook: {self.facebook_link} artist_image: {self.image_link} artist_website: {self.website_link} artist_searching: {self.searching_venues} artist_description: {self.search_description} shows: {self.shows}>'
@@ -52,12 +126,51 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'show'
+    # detail pages and listings filter shows by venue/artist and by date
+    __table_args__ = (
+        db.Index('ix_show_venue_id_date', 'venue_id', 'date'),
+        db.Index('ix_show_artist_id_date', 'artist_id', 'date'),
+        db.Index('ix_show_date', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         'artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'venue.id'), nullable=False)
+    version = row_version()
 
     def __repr__(self):
         f'<Show show_id: {self.id} show_date: {self.date} show_artist_id: {self.artist_id} show_venue_id: {self.venue_id}>'
+
+
+class ShowCountClock(db.Model):
+    # single row: the instant the venue/artist show counters were split into
+    # upcoming and past at. Shows starting after it are counted as upcoming.
+    __tablename__ = 'show_count_clock'
+    id = db.Column(db.Integer, primary_key=True)
+    counted_at = db.Column(db.DateTime, nullable=False)
+
+
+class VenueArea(db.Model):
+    # the /venues directory, materialised: one row per city/state listing
+    # its venues as {id, name, upcoming_show_count}, kept up to date by
+    # areas.py
+    __tablename__ = 'venue_area'
+    __table_args__ = (
+        db.UniqueConstraint('state', 'city', name='uq_venue_area_state_city'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    venues = db.Column(db.JSON, nullable=False)
+
+
+def create_schema():
+    # the tables straight from the models, for scratch databases (tests,
+    # benchmarks); deployed databases are built by the migrations. The
+    # trigram indexes need pg_trgm on PostgreSQL.
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as connection:
+            connection.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    db.create_all()
@@ -0,0 +1,344 @@
+from datetime import datetime
+from models import (db, Venue, Artist, Show, Genre, ShowCountClock, VenueArea,
+                    venue_genre, artist_genre)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+
+def filter_genre(query, model, genre):
+    # restricts query to model rows tagged with genre through the indexed
+    # (genre_id, <model>_id) association
+    association, key = {
+        Venue: (venue_genre, venue_genre.c.venue_id),
+        Artist: (artist_genre, artist_genre.c.artist_id),
+    }[model]
+    return query.join(association, key == model.id).join(
+        Genre, Genre.id == association.c.genre_id).filter(Genre.name == genre)
+
+
+def started_shows(key, now):
+    # per venue/artist (key is Show.venue_id or Show.artist_id): shows still
+    # counted as upcoming that have started by now, i.e. since the counters
+    # were last rolled. Only that window of the show date index is read.
+    counted_at = db.session.query(ShowCountClock.counted_at).filter(
+        ShowCountClock.id == 1).scalar_subquery()
+    return db.session.query(
+        key.label('id'), db.func.count(Show.id).label('started')
+    ).filter(Show.date > counted_at, Show.date <= now).group_by(key).subquery()
+
+
+def upcoming_count(model, started):
+    return model.upcoming_show_count - db.func.coalesce(started.c.started, 0)
+
+
+def venue_directory(now=None, genre=None, state=None):
+    # builds the city/state -> venues -> num_upcoming_shows listing in one
+    # query, from the maintained show counters instead of the show rows.
+    # also returns the earliest upcoming show start, when the counts change.
+    if now is None:
+        now = datetime.now()
+    started = started_shows(Show.venue_id, now)
+    next_show = db.session.query(db.func.min(Show.date)).filter(
+        Show.date > now).scalar_subquery()
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        upcoming_count(Venue, started).label('num_upcoming_shows'),
+        next_show.label('next_show')
+    ).outerjoin(started, started.c.id == Venue.id)
+    if genre:
+        query = filter_genre(query, Venue, genre)
+    if state:
+        query = query.filter(Venue.state == state)
+    rows = query.order_by(Venue.state, Venue.city, Venue.name).all()
+
+    areas = {}
+    boundary = None
+    for row in rows:
+        if row.next_show is not None and (
+                boundary is None or row.next_show < boundary):
+            boundary = row.next_show
+        area = areas.get((row.city, row.state))
+        if area is None:
+            area = areas[(row.city, row.state)] = {
+                "city": row.city,
+                "state": row.state,
+                "venues": []
+            }
+        area["venues"].append({
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows,
+        })
+    return list(areas.values()), boundary
+
+
+def area_directory(now=None, state=None):
+    # the same listing as venue_directory, read from the materialised
+    # venue_area rows: one indexed read of the areas plus one of the shows
+    # started since the counters were last rolled.
+    if now is None:
+        now = datetime.now()
+    next_show = db.session.query(db.func.min(Show.date)).filter(
+        Show.date > now).scalar_subquery()
+    query = db.session.query(VenueArea.city, VenueArea.state, VenueArea.venues,
+                             next_show.label('next_show'))
+    if state:
+        query = query.filter(VenueArea.state == state)
+    rows = query.order_by(VenueArea.state, VenueArea.city).all()
+    started = started_shows(Show.venue_id, now)
+    started = dict(db.session.query(started.c.id, started.c.started).all())
+
+    areas = [{
+        "city": row.city,
+        "state": row.state,
+        "venues": [{
+            "id": venue["id"],
+            "name": venue["name"],
+            "num_upcoming_shows": venue["upcoming_show_count"] - started.get(venue["id"], 0),
+        } for venue in row.venues]
+    } for row in rows]
+    return areas, rows[0].next_show if rows else None
+
+
+def artist_listing(genre=None, state=None):
+    query = db.session.query(Artist.id, Artist.name)
+    if genre:
+        query = filter_genre(query, Artist, genre)
+    if state:
+        query = query.filter(Artist.state == state)
+    return query.order_by(Artist.name).all()
+
+
+def next_boundary(data):
+    # upcoming shows are ordered by start time, so the first one to start
+    # is when data assembled by venue_detail/artist_detail goes stale
+    if data["upcoming_shows"]:
+        return data["upcoming_shows"][0]["start_time"]
+    return None
+
+
+def partition_shows(rows, now):
+    # splits show rows into past/upcoming against one captured timestamp,
+    # counting both in the same pass.
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        show = row._asdict()
+        if row.start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def venue_shows(venue_id, now=None):
+    if now is None:
+        now = datetime.now()
+    rows = db.session.query(
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.date.label('start_time')
+    ).join(Artist, Show.artist_id == Artist.id).filter(
+        Show.venue_id == venue_id, Show.date.isnot(None)).order_by(Show.date).all()
+    return partition_shows(rows, now)
+
+
+def artist_shows(artist_id, now=None):
+    if now is None:
+        now = datetime.now()
+    rows = db.session.query(
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.date.label('start_time')
+    ).join(Venue, Show.venue_id == Venue.id).filter(
+        Show.artist_id == artist_id, Show.date.isnot(None)).order_by(Show.date).all()
+    return partition_shows(rows, now)
+
+
+def show_page(after=None, limit=30, upcoming_only=True, now=None):
+    # one keyset page of the /shows listing ordered by (date, id); fetches
+    # one extra row to tell whether a next page exists.
+    if now is None:
+        now = datetime.now()
+    query = db.session.query(
+        Show.id,
+        Show.date.label('start_time'),
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.version,
+        Venue.version.label('venue_version'),
+        Artist.version.label('artist_version')
+    ).join(Artist, Show.artist_id == Artist.id).join(
+        Venue, Show.venue_id == Venue.id).filter(Show.date.isnot(None))
+    if upcoming_only:
+        query = query.filter(Show.date > now)
+    if after is not None:
+        query = query.filter(db.tuple_(Show.date, Show.id) > after)
+    rows = query.order_by(Show.date, Show.id).limit(limit + 1).all()
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1].start_time, rows[-1].id)
+    return rows, next_after
+
+
+def format_show_cursor(after):
+    return '{}_{}'.format(after[0].isoformat(), after[1])
+
+
+def parse_show_cursor(value):
+    date, _, show_id = value.rpartition('_')
+    return datetime.fromisoformat(date), int(show_id)
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search(model, search_term, limit=None, now=None):
+    # case-insensitive substring search on name, served by the pg_trgm GIN
+    # index on PostgreSQL and ranked by trigram similarity, with upcoming
+    # show counts read from the maintained counters.
+    if now is None:
+        now = datetime.now()
+    show_key = {Venue: Show.venue_id, Artist: Show.artist_id}[model]
+    started = started_shows(show_key, now)
+    query = db.session.query(
+        model.id, model.name,
+        upcoming_count(model, started).label('num_upcoming_shows')
+    ).outerjoin(started, started.c.id == model.id).filter(
+        model.name.ilike('%{}%'.format(escape_like(search_term)), escape='\\')
+    )
+    if db.engine.dialect.name == 'postgresql':
+        query = query.order_by(
+            db.func.similarity(model.name, search_term).desc(), model.name)
+    else:
+        query = query.order_by(model.name)
+    result = [row._asdict() for row in query.limit(limit).all()]
+    return {
+        "count": len(result),
+        "data": result
+    }
+
+
+def venue_detail(venue_id, now=None):
+    # assembles the show_venue page data, or None for an unknown venue
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return None
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.name for genre in venue.genre_tags],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.searching_talent,
+        "seeking_description": venue.search_description,
+        "image_link": venue.image_link,
+    }
+    data.update(venue_shows(venue_id, now))
+    return data
+
+
+def artist_detail(artist_id, now=None):
+    # assembles the show_artist page data, or None for an unknown artist
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return None
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": [genre.name for genre in artist.genre_tags],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venues": artist.searching_venues,
+        "seeking_description": artist.search_description,
+        "image_link": artist.image_link,
+    }
+    data.update(artist_shows(artist_id, now))
+    return data
+
+
+#----------------------------------------------------------------------------#
+# Versions.
+#
+# Cheap aggregates over row versions that change whenever the data assembled
+# for the matching view would; the JSON API derives its ETags from them
+# without building the data itself.
+#----------------------------------------------------------------------------#
+
+
+def show_versions(now):
+    return (
+        db.func.count(Show.id),
+        db.func.sum(Show.id),
+        db.func.sum(Show.version),
+        db.func.min(Show.date).filter(Show.date > now)
+    )
+
+
+def venue_version(venue_id, now=None):
+    if now is None:
+        now = datetime.now()
+    venue = db.session.query(Venue.version).filter(Venue.id == venue_id).scalar()
+    if venue is None:
+        return None
+    shows = db.session.query(
+        *show_versions(now), db.func.sum(Artist.version)
+    ).join(Artist, Show.artist_id == Artist.id).filter(
+        Show.venue_id == venue_id).one()
+    return ('venue', venue_id, venue) + tuple(shows)
+
+
+def artist_version(artist_id, now=None):
+    if now is None:
+        now = datetime.now()
+    artist = db.session.query(Artist.version).filter(Artist.id == artist_id).scalar()
+    if artist is None:
+        return None
+    shows = db.session.query(
+        *show_versions(now), db.func.sum(Venue.version)
+    ).join(Venue, Show.venue_id == Venue.id).filter(
+        Show.artist_id == artist_id).one()
+    return ('artist', artist_id, artist) + tuple(shows)
+
+
+def venue_directory_version(now=None):
+    # the directory is venue rows, whose show counters bump their version,
+    # less the shows started since the counters were rolled, which changes
+    # only when the next upcoming show starts: an index-backed MIN instead
+    # of an aggregate over every show
+    if now is None:
+        now = datetime.now()
+    next_show = db.session.query(db.func.min(Show.date)).filter(
+        Show.date > now).scalar_subquery()
+    venues = db.session.query(
+        db.func.count(Venue.id), db.func.sum(Venue.id), db.func.sum(Venue.version),
+        next_show).one()
+    return ('venues',) + tuple(venues)
+
+
+def artist_listing_version():
+    artists = db.session.query(
+        db.func.count(Artist.id), db.func.sum(Artist.id), db.func.sum(Artist.version)).one()
+    return ('artists',) + tuple(artists)
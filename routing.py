@@ -0,0 +1,138 @@
+import itertools
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# read-your-writes: a client that wrote reads from the primary until the
+# timestamp in this cookie
+STICKY_COOKIE = 'fyyur_primary_until'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(SignallingSession):
+    # sends statements to the replica engine picked for the current request,
+    # if any; flushes always go to the primary.
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('db_replica') if has_request_context() else None
+        if replica is not None and not self._flushing:
+            return replica
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class ReplicaRouter(object):
+    # picks the engine for each request: writes (any POST/DELETE not marked
+    # read_only) and clients inside their sticky window use the primary,
+    # other reads a replica chosen round-robin or by fewest connections.
+
+    def __init__(self, db):
+        self.db = db
+        self.bind_keys = []
+        self.last_write = 0.0
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        urls = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        self.bind_keys = []
+        for number, url in enumerate(urls):
+            key = 'replica{}'.format(number)
+            binds[key] = url
+            self.bind_keys.append(key)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        self.app = app
+        self.selection = app.config.get('REPLICA_SELECTION', 'round_robin')
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        self._cycle = itertools.cycle(self.bind_keys)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def read_only(view):
+        # marks a non-GET view that only reads (e.g. a POSTed search form)
+        view.read_only = True
+        return view
+
+    def is_write(self):
+        if request.method in READ_METHODS:
+            return False
+        view = self.app.view_functions.get(request.endpoint)
+        return not getattr(view, 'read_only', False)
+
+    def sticky(self):
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def replica(self):
+        with self._lock:
+            if self.selection == 'least_connections':
+                return min(self.replicas(), key=checked_out)
+            return self.db.get_engine(self.app, bind=next(self._cycle))
+
+    def replicas(self):
+        return [self.db.get_engine(self.app, bind=key) for key in self.bind_keys]
+
+    def before_request(self):
+        g.db_write = self.is_write()
+        if self.bind_keys and not g.db_write and not self.sticky():
+            g.db_replica = self.replica()
+
+    def after_request(self, response):
+        if g.get('db_write'):
+            self.last_write = time.monotonic()
+            response.set_cookie(STICKY_COOKIE,
+                                '{:.3f}'.format(time.time() + self.sticky_seconds),
+                                max_age=int(self.sticky_seconds) + 1,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def may_be_stale(self):
+        # True while this request reads a replica that may not have caught
+        # up with a write this process made within the sticky window
+        return (g.get('db_replica') is not None
+                and time.monotonic() - self.last_write < self.sticky_seconds)
+
+    def cache_ttl(self, ttl=None):
+        # cap on how long to cache what this request read. A replica may be
+        # behind a write another process made, which may_be_stale() cannot
+        # see, so replica reads are kept no longer than the sticky window.
+        if g.get('db_replica') is None:
+            return ttl
+        return self.sticky_seconds if ttl is None else min(ttl, self.sticky_seconds)
+
+    def stats(self):
+        return {
+            "replicas": len(self.bind_keys),
+            "selection": self.selection,
+            "checked_out": [checked_out(engine) for engine in self.replicas()],
+        }
+
+
+def checked_out(engine):
+    # pools without a checkout count (SQLite's) count as idle
+    pool = engine.pool
+    return pool.checkedout() if hasattr(pool, 'checkedout') else 0
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    # SQLAlchemy whose session reads from replicas through self.router
+
+    def __init__(self, *args, **kwargs):
+        self.router = ReplicaRouter(self)
+        super(RoutingSQLAlchemy, self).__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        self.router.init_app(app)
+        super(RoutingSQLAlchemy, self).init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -2,3 +2,46 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// search-as-you-type: debounced lookups against /api/search, rendered as a
+// suggestion list under the navbar search box.
+(function () {
+  var input = document.querySelector('form.search input[name="search_term"]');
+  if (!input) return;
+  var form = input.form;
+  var type = form.getAttribute('action').indexOf('/artists') === 0 ? 'artist' : 'venue';
+  var list = document.createElement('ul');
+  list.className = 'search-suggestions';
+  form.appendChild(list);
+  var timer = null;
+  var latest = '';
+
+  function render(term, results) {
+    if (term !== latest) return;
+    list.innerHTML = '';
+    results.data.forEach(function (item) {
+      var li = document.createElement('li');
+      var a = document.createElement('a');
+      a.href = '/' + type + 's/' + item.id;
+      a.textContent = item.name;
+      li.appendChild(a);
+      list.appendChild(li);
+    });
+  }
+
+  input.addEventListener('input', function () {
+    var term = input.value.trim();
+    latest = term;
+    clearTimeout(timer);
+    if (!term) {
+      list.innerHTML = '';
+      return;
+    }
+    timer = setTimeout(function () {
+      fetch('/api/search?type=' + type + '&limit=8&q=' + encodeURIComponent(term))
+        .then(function (response) { return response.json(); })
+        .then(function (results) { render(term, results); })
+        .catch(function (e) { console.log(e); });
+    }, 200);
+  });
+})();
@@ -0,0 +1,149 @@
+import os
+import sys
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+#----------------------------------------------------------------------------#
+# Test app.
+#
+# The app runs against TEST_DATABASE_URL (an in-memory SQLite database by
+# default; point it at a scratch PostgreSQL database to test there - its
+# tables are dropped afterwards). Never the DATABASE_URL the app is deployed
+# with.
+#----------------------------------------------------------------------------#
+
+config.SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+config.SQLALCHEMY_REPLICA_URIS = []
+config.PAGE_CACHE_BACKEND = 'memory'
+config.LOG_FILE = os.path.join(tempfile.mkdtemp(), 'test.log')
+# a statement shape repeated in one request fails the test outright
+config.SQL_REPEAT_RAISE = True
+
+import app as fyyur
+from models import db, create_schema, Genre, Venue, Artist, Show
+
+AREAS = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX')]
+VENUES = 9
+ARTISTS = 9
+# days from now of each venue/artist pair's shows, past and upcoming
+SHOW_DAYS = (-30, -3, 2, 7, 40)
+
+
+def seed(venues=VENUES, artists=ARTISTS):
+    # adds venues and artists, each venue with past and upcoming shows by
+    # three of the new artists
+    now = datetime.now()
+    genres = Genre.for_names(['Jazz', 'Rock n Roll', 'Folk'])
+    first = db.session.query(db.func.count(Venue.id)).scalar()
+    new_venues, new_artists = [], []
+    for i in range(first, first + venues):
+        city, state = AREAS[i % len(AREAS)]
+        new_venues.append(Venue(
+            name='The Musical Hop %d' % i, city=city, state=state,
+            address='%d Main St' % i, phone='123-123-1234',
+            genres='Jazz,Folk', genre_tags=[genres[0], genres[2]],
+            image_link='https://example.com/venue.jpg', searching_talent=i % 2 == 0))
+    first = db.session.query(db.func.count(Artist.id)).scalar()
+    for i in range(first, first + artists):
+        city, state = AREAS[i % len(AREAS)]
+        new_artists.append(Artist(
+            name='The Wild Sax Band %d' % i, city=city, state=state,
+            phone='123-123-1234', genres='Rock n Roll', genre_tags=[genres[1]],
+            image_link='https://example.com/artist.jpg', searching_venues=i % 2 == 0))
+    db.session.add_all(new_venues + new_artists)
+    db.session.flush()
+    for venue in new_venues:
+        for artist in new_artists[:3]:
+            for days in SHOW_DAYS:
+                db.session.add(Show(date=now + timedelta(days=days),
+                                    venue_id=venue.id, artist_id=artist.id))
+    db.session.commit()
+
+
+@pytest.fixture(scope='session')
+def app():
+    fyyur.app.config['TESTING'] = True
+    fyyur.app.config['WTF_CSRF_ENABLED'] = False
+    with fyyur.app.app_context():
+        create_schema()
+        seed()
+        db.session.remove()
+    yield fyyur.app
+    with fyyur.app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    # every test starts with a cold page cache, so budgets cover the queries
+    # a cache miss makes
+    fyyur.page_cache.clear()
+    return app.test_client()
+
+
+#----------------------------------------------------------------------------#
+# Query budgets.
+#----------------------------------------------------------------------------#
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(object):
+    # counts the statements run and the ORM objects loaded, by class name,
+    # while a budget is open
+
+    def __init__(self, engine):
+        self.statements = []
+        self.loaded = Counter()
+        self.engine = engine
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        self.statements.append(statement)
+
+    def load(self, target, context):
+        self.loaded[type(target).__name__] += 1
+
+    @contextmanager
+    def __call__(self, queries=None, loaded=None):
+        # fails when more than queries statements run, or more than
+        # loaded[Model] objects of a model are loaded, inside the block
+        del self.statements[:]
+        self.loaded.clear()
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(db.Model, 'load', self.load, propagate=True)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+            event.remove(db.Model, 'load', self.load)
+        problems = []
+        if queries is not None and len(self.statements) > queries:
+            problems.append('{} queries, budget {}:\n{}'.format(
+                len(self.statements), queries,
+                '\n'.join('  ' + ' '.join(s.split()) for s in self.statements)))
+        for model, limit in (loaded or {}).items():
+            count = self.loaded[model.__name__]
+            if count > limit:
+                problems.append('{} {} objects loaded, budget {}'.format(
+                    count, model.__name__, limit))
+        if problems:
+            raise BudgetExceeded('\n'.join(problems))
+
+
+@pytest.fixture
+def budget(app):
+    with app.app_context():
+        engine = db.engine
+    return QueryBudget(engine)
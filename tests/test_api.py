@@ -0,0 +1,57 @@
+from sqlalchemy.orm import Session
+
+from models import db, Venue
+from test_query_budgets import VENUE_FORM
+
+
+def test_overlapping_edits_both_apply_and_change_the_etag(app, client):
+    etag = client.get('/api/v1/venues/3').headers['ETag']
+    with app.app_context():
+        # a second editor loads the venue before the first one saves
+        other = Session(bind=db.engine)
+        venue = other.get(Venue, 3)
+        venue.address = '2 Overlap St'
+
+        response = client.post('/venues/3/edit', data=dict(
+            VENUE_FORM, name='The Musical Hop 2', city='Austin', state='TX'))
+        assert response.status_code == 302
+        other.commit()
+        other.close()
+
+        venue = Venue.query.get(3)
+        assert (venue.address, venue.state) == ('2 Overlap St', 'TX')
+        assert venue.version >= 3
+        db.session.remove()
+    response = client.get('/api/v1/venues/3')
+    assert response.headers['ETag'] != etag
+    assert client.get('/api/v1/venues/3', headers={
+        'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_directory_etag_matches_weakly_and_changes_with_a_new_show(client, budget):
+    etag = client.get('/api/v1/venues').headers['ETag']
+    # the venue aggregate alone decides the 304
+    with budget(queries=1):
+        response = client.get('/api/v1/venues', headers={'If-None-Match': 'W/' + etag})
+    assert response.status_code == 304
+
+    response = client.post('/shows/create', data={
+        'venue_id': '4', 'artist_id': '2', 'start_time': '2031-01-01 20:00:00'})
+    assert response.status_code == 200
+    assert client.get('/api/v1/venues', headers={
+        'If-None-Match': etag}).status_code == 200
+
+
+def test_search_ranks_rows_filtered_from_a_shorter_prefix(app, client):
+    with app.app_context():
+        for name in ('Aardvark Zedsort Bar', 'Zedsort Hall', 'Zedsort'):
+            db.session.add(Venue(name=name, city='Austin', state='TX',
+                                 address='1 Main St', phone='512-123-1234',
+                                 genres='Jazz', image_link=VENUE_FORM['image_link']))
+        db.session.commit()
+        db.session.remove()
+    # caches every venue containing 'zed', ordered by name
+    assert client.get('/api/search?q=zed').get_json()['count'] == 3
+    response = client.get('/api/search?q=zedsort&limit=2')
+    assert [row['name'] for row in response.get_json()['data']] == [
+        'Zedsort', 'Zedsort Hall']
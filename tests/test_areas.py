@@ -0,0 +1,26 @@
+import areas
+from models import db, VenueArea
+
+
+def test_area_inserted_concurrently_is_updated(app, monkeypatch):
+    # another transaction inserts the missing area row between the lock,
+    # which finds nothing, and this one's insert
+    read_venues = areas.area_venues
+
+    def venues_then_race(connection, city, state):
+        venues = read_venues(connection, city, state)
+        monkeypatch.setattr(areas, 'area_venues', read_venues)
+        connection.execute(areas.area_table.insert().values(
+            city=city, state=state, venues=[]))
+        return venues
+
+    with app.app_context():
+        connection = db.session.connection()
+        connection.execute(areas.area_table.delete().where(
+            areas.area_table.c.city == 'Austin'))
+        monkeypatch.setattr(areas, 'area_venues', venues_then_race)
+        areas.refresh_areas(connection, {('Austin', 'TX')})
+        area = VenueArea.query.filter_by(city='Austin', state='TX').one()
+        assert len(area.venues) == len(read_venues(connection, 'Austin', 'TX')) > 0
+        db.session.rollback()
+        db.session.remove()
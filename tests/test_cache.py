@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache import LRUBackend, PageCache, RedisBackend, make_page_cache
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    if request.param == 'memory':
+        return LRUBackend()
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisBackend(fakeredis.FakeRedis())
+
+
+def test_get_set_and_stats(backend):
+    cache = PageCache(backend)
+    assert cache.get('venue', 1) is None
+    cache.set('venue', 1, {'name': 'The Musical Hop'})
+    assert cache.get('venue', 1) == {'name': 'The Musical Hop'}
+    assert cache.stats() == {"backend": backend.name, "hits": 1, "misses": 1,
+                             "invalidations": 0}
+
+
+def test_invalidate(backend):
+    cache = PageCache(backend)
+    cache.set('venue', 1, 'one')
+    cache.set('venue', 2, 'two')
+    cache.set('artist', 1, 'artist one')
+    cache.invalidate(('venue', 1), ('artist', 1))
+    assert cache.get('venue', 1) is None
+    assert cache.get('artist', 1) is None
+    assert cache.get('venue', 2) == 'two'
+    assert cache.stats()['invalidations'] == 2
+
+
+def test_set_until_expires_at_the_boundary(backend):
+    cache = PageCache(backend)
+    now = datetime.now()
+    cache.set_until('venue', 1, 'soon stale', now + timedelta(milliseconds=50))
+    cache.set_until('venue', 2, 'no upcoming shows', None)
+    cache.set_until('venue', 3, 'already stale', now - timedelta(seconds=1))
+    assert cache.get('venue', 1) == 'soon stale'
+    time.sleep(0.1)
+    assert cache.get('venue', 1) is None
+    assert cache.get('venue', 2) == 'no upcoming shows'
+    assert cache.get('venue', 3) is None
+
+
+def test_set_until_is_capped_by_the_ttl(backend):
+    cache = PageCache(backend, ttl=0.05)
+    now = datetime.now()
+    cache.set_until('venue', 1, 'capped', now + timedelta(days=1))
+    assert cache.get('venue', 1) == 'capped'
+    time.sleep(0.1)
+    assert cache.get('venue', 1) is None
+
+
+def test_set_until_counts_from_when_it_is_set(backend):
+    # a show that started while the data was being assembled
+    cache = PageCache(backend)
+    boundary = datetime.now() + timedelta(milliseconds=20)
+    time.sleep(0.05)
+    cache.set_until('venue', 1, 'started while assembling', boundary)
+    assert cache.get('venue', 1) is None
+
+
+def test_memory_backend_is_capped_by_the_local_ttl():
+    config = {'PAGE_CACHE_BACKEND': 'memory', 'PAGE_CACHE_SIZE': 10,
+              'PAGE_CACHE_TTL': None, 'PAGE_CACHE_LOCAL_TTL': 60}
+    assert make_page_cache(config).ttl == 60
+    assert make_page_cache(dict(config, PAGE_CACHE_TTL=5)).ttl == 5
+
+
+def test_clear(backend):
+    cache = PageCache(backend)
+    cache.set('venue', 1, 'one')
+    if isinstance(backend, RedisBackend):
+        backend.client.set('other:key', 'kept')
+    cache.clear()
+    assert cache.get('venue', 1) is None
+    if isinstance(backend, RedisBackend):
+        assert backend.client.get('other:key') == b'kept'
@@ -0,0 +1,27 @@
+import gzip
+
+import pytest
+
+
+def export(client, accept_encoding):
+    response = client.get('/api/export/venues?state=CA',
+                          headers={'Accept-Encoding': accept_encoding})
+    body = response.get_data()
+    response.close()
+    return response, body
+
+
+@pytest.mark.parametrize('accept_encoding', ['gzip', 'br, gzip;q=0.5', '*'])
+def test_export_is_gzipped_when_accepted(client, accept_encoding):
+    response, body = export(client, accept_encoding)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert b'"state": "CA"' in gzip.decompress(body)
+
+
+@pytest.mark.parametrize('accept_encoding', ['', 'identity', 'gzip;q=0', 'br'])
+def test_export_is_plain_otherwise(client, accept_encoding):
+    response, body = export(client, accept_encoding)
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.vary
+    assert b'"state": "CA"' in body
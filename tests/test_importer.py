@@ -0,0 +1,120 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from exporter import export_stream
+from importer import import_file
+from models import db, Venue, Show
+
+VENUE = {
+    'name': 'Import Venue', 'city': 'Austin', 'state': 'TX',
+    'address': '1 Congress Ave', 'phone': '512-123-1234', 'genres': 'Jazz',
+    'image_link': 'https://example.com/venue.jpg',
+    'facebook_link': 'https://www.facebook.com/venue',
+    'website_link': 'https://example.com', 'seeking_description': '',
+}
+LINKS = 'https://example.com/venue.jpg,https://www.facebook.com/venue,https://example.com'
+
+
+def write_lines(path, lines):
+    path.write_text(''.join(line + '\n' for line in lines))
+    return str(path)
+
+
+def test_bad_rows_are_rejected_without_stopping_the_import(app, tmp_path):
+    path = write_lines(tmp_path / 'venues.jsonl', [
+        json.dumps(dict(VENUE, name='Import Repeated Genres', genres='Jazz,Jazz')),
+        '{"name": "Import Truncated',
+        json.dumps(dict(VENUE, name='Import After Bad Line')),
+    ])
+    with app.app_context():
+        importer, _ = import_file('venues', path, batch_size=1)
+        venue = Venue.query.filter_by(name='Import Repeated Genres').one()
+        assert [genre.name for genre in venue.genre_tags] == ['Jazz']
+        assert Venue.query.filter_by(name='Import After Bad Line').count() == 1
+        db.session.remove()
+    assert importer.imported == 2
+    assert [number for number, _, _ in importer.rejected] == [2]
+    assert 'Import Truncated' in (tmp_path / 'venues.jsonl.rejects.csv').read_text()
+
+
+def test_csv_booleans(app, tmp_path):
+    header = ('name,city,state,address,phone,genres,image_link,facebook_link,'
+              'website_link,seeking_talent')
+    path = write_lines(tmp_path / 'venues.csv', [header] + [
+        'Import Seeking {0},Austin,TX,1 Main St,512-123-1234,Jazz,{1},{0}'.format(value, LINKS)
+        for value in ('False', '0', 'no', '', 'True', 'yes')])
+    with app.app_context():
+        import_file('venues', path)
+        seeking = dict(db.session.query(Venue.name, Venue.searching_talent).filter(
+            Venue.name.like('Import Seeking %')))
+        db.session.remove()
+    assert seeking == {
+        'Import Seeking False': False, 'Import Seeking 0': False,
+        'Import Seeking no': False, 'Import Seeking ': False,
+        'Import Seeking True': True, 'Import Seeking yes': True,
+    }
+
+
+@pytest.mark.parametrize('format', ['csv', 'jsonl'])
+def test_export_imports_back(app, tmp_path, format):
+    with app.app_context():
+        venue = Venue(name='Import Round Trip', city='Round Rock', state='TX',
+                      address='1 Main St', phone='512-123-1234', genres='Jazz',
+                      image_link=VENUE['image_link'],
+                      facebook_link=VENUE['facebook_link'],
+                      website_link=VENUE['website_link'], searching_talent=True,
+                      search_description='Looking for a trio')
+        db.session.add(venue)
+        db.session.flush()
+        # microseconds, which the show form's format has no room for
+        start = datetime(2031, 5, 1, 20, 30, 15, 123456)
+        show = Show(date=start, venue_id=venue.id, artist_id=1)
+        db.session.add(show)
+        db.session.commit()
+        exported_shows = b''.join(export_stream('shows', format=format, city='Round Rock'))
+        db.session.delete(show)
+        db.session.commit()
+        path = tmp_path / ('shows.' + format)
+        path.write_bytes(exported_shows)
+        shows, _ = import_file('shows', str(path))
+        assert Show.query.filter_by(venue_id=venue.id).one().date == start.replace(
+            microsecond=0)
+
+        exported = b''.join(export_stream('venues', format=format, city='Round Rock'))
+        Show.query.filter_by(venue_id=venue.id).delete()
+        db.session.delete(venue)
+        db.session.commit()
+        path = tmp_path / ('venues.' + format)
+        path.write_bytes(exported)
+        importer, _ = import_file('venues', str(path))
+        venue = Venue.query.filter_by(name='Import Round Trip').one()
+        assert (venue.searching_talent, venue.search_description) == (
+            True, 'Looking for a trio')
+        db.session.delete(venue)
+        db.session.commit()
+        db.session.remove()
+    assert shows.rejected == []
+    assert importer.rejected == []
+
+
+def test_iso_start_times_import(app, tmp_path):
+    # as /api/v1/shows writes them
+    path = write_lines(tmp_path / 'shows.jsonl', [json.dumps(
+        {'venue_id': 1, 'artist_id': 1, 'start_time': '2032-02-03T19:00:00'})])
+    with app.app_context():
+        importer, _ = import_file('shows', path)
+        assert Show.query.filter_by(date=datetime(2032, 2, 3, 19)).count() == 1
+        db.session.remove()
+    assert importer.rejected == []
+
+
+def test_cli_import_warns_that_worker_caches_lag(app, tmp_path):
+    # the memory page cache lives in each web worker, out of the CLI's reach
+    path = write_lines(tmp_path / 'venues.jsonl', [
+        json.dumps(dict(VENUE, name='Import From The CLI'))])
+    result = app.test_cli_runner().invoke(args=['import', 'venues', path])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 1 venues' in result.output
+    assert 'may show the old data for up to 60s' in result.output
@@ -0,0 +1,51 @@
+import atexit
+import logging
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from instrumentation import DroppingQueueHandler, ShardedCounters, init_logging
+
+
+def test_exited_threads_shards_are_folded_in_as_new_ones_start():
+    counters = ShardedCounters()
+
+    def request():
+        counters.inc('requests')
+    for _ in range(50):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+    # one thread per request, never collected: only the last shard is kept
+    assert len(counters._shards) == 1
+    assert counters.collect()['requests'] == 50
+
+
+def test_failed_statements_leave_no_start_time_on_the_connection(app):
+    from models import db
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for _ in range(3):
+                with pytest.raises(DBAPIError):
+                    connection.execute(text('SELECT * FROM no_such_table'))
+            assert connection.info.get('query_started') == []
+
+
+def test_app_logger_only_writes_through_the_queue(tmp_path):
+    # Flask's stderr handler would write on the request thread
+    app = Flask(__name__)
+    app.logger.info('attaches the default handler')
+    listener = init_logging(app, str(tmp_path / 'app.log'))
+    try:
+        assert [type(handler) for handler in app.logger.handlers] == [DroppingQueueHandler]
+        assert not app.logger.propagate
+    finally:
+        fyyur_logger = logging.getLogger('fyyur')
+        for handler in fyyur_logger.handlers[:]:
+            fyyur_logger.removeHandler(handler)
+        fyyur_logger.propagate = True
+        atexit.unregister(listener.stop)
+        listener.stop()
@@ -0,0 +1,109 @@
+import pytest
+
+import app as fyyur
+from models import Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Query budgets per route.
+#
+# Each case is (method, url, form, queries, loaded): the route may run at
+# most queries statements and load at most loaded[Model] ORM objects on a
+# cold page cache. Budgets are the counts the route needs today; raise one
+# only with a reason.
+#----------------------------------------------------------------------------#
+
+NO_ROWS = {Venue: 0, Artist: 0, Show: 0}
+ONE_VENUE = {Venue: 1, Artist: 0, Show: 0}
+ONE_ARTIST = {Venue: 0, Artist: 1, Show: 0}
+
+VENUE_FORM = {
+    'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY',
+    'address': '335 Delancey Street', 'phone': '914-003-1132',
+    'genres': 'Jazz', 'image_link': '', 'facebook_link': '',
+    'website_link': '', 'seeking_description': '',
+}
+ARTIST_FORM = {
+    'name': 'Guns N Petals', 'city': 'San Francisco', 'state': 'CA',
+    'phone': '326-123-5000', 'genres': 'Rock n Roll', 'image_link': '',
+    'facebook_link': '', 'website_link': '', 'seeking_description': '',
+}
+
+READS = [
+    ('get', '/', None, 0, NO_ROWS),
+    ('get', '/venues', None, 2, NO_ROWS),
+    ('get', '/venues?genre=Jazz', None, 1, NO_ROWS),
+    ('get', '/artists', None, 1, NO_ROWS),
+    ('get', '/shows', None, 1, NO_ROWS),
+    ('get', '/venues/1', None, 3, ONE_VENUE),
+    ('get', '/artists/1', None, 3, ONE_ARTIST),
+    ('get', '/venues/1/edit', None, 2, ONE_VENUE),
+    ('get', '/artists/1/edit', None, 2, ONE_ARTIST),
+    ('post', '/venues/search', {'search_term': 'hop'}, 1, NO_ROWS),
+    ('post', '/artists/search', {'search_term': 'band'}, 1, NO_ROWS),
+    ('get', '/api/search?q=hop', None, 1, NO_ROWS),
+    ('get', '/api/v1/venues', None, 3, NO_ROWS),
+    ('get', '/api/v1/venues/1', None, 5, ONE_VENUE),
+    ('get', '/api/v1/artists', None, 2, NO_ROWS),
+    ('get', '/api/v1/artists/1', None, 5, ONE_ARTIST),
+    ('get', '/api/v1/shows', None, 1, NO_ROWS),
+]
+
+WRITES = [
+    ('post', '/venues/create', VENUE_FORM, 6, NO_ROWS),
+    ('post', '/artists/create', ARTIST_FORM, 3, NO_ROWS),
+    ('post', '/shows/create', {'venue_id': '1', 'artist_id': '2',
+                               'start_time': '2030-01-01 20:00:00'}, 9, NO_ROWS),
+    ('post', '/venues/2/edit', dict(VENUE_FORM, name='The Musical Hop 1'), 7, ONE_VENUE),
+    ('post', '/artists/2/edit', dict(ARTIST_FORM, name='The Wild Sax Band 1'), 6, ONE_ARTIST),
+]
+
+
+def fetch(client, method, url, form):
+    # streamed pages only finish rendering, and querying, once read
+    response = getattr(client, method)(url, data=form)
+    response.get_data()
+    response.close()
+    return response
+
+
+@pytest.mark.parametrize('method, url, form, queries, loaded', READS + WRITES)
+def test_route_within_budget(client, budget, method, url, form, queries, loaded):
+    with budget(queries=queries, loaded=loaded):
+        response = fetch(client, method, url, form)
+    assert response.status_code in (200, 302)
+
+
+def test_budget_catches_per_row_queries(app, budget):
+    # the harness itself: loading shows and then each one's venue is one
+    # query per show
+    from models import db
+    with app.app_context():
+        with pytest.raises(AssertionError, match='queries, budget 1'):
+            with budget(queries=1):
+                for show in Show.query.limit(3):
+                    show.venue.name
+        db.session.remove()
+
+
+def test_listing_queries_do_not_grow_with_the_data(app, client, budget):
+    # the same queries with twice as many venues, artists and shows; a fixed
+    # budget on one data size would not notice one query per area or venue
+    from conftest import seed
+    from models import db
+    urls = ['/venues', '/venues?genre=Jazz', '/artists', '/shows']
+
+    def count_queries():
+        fyyur.page_cache.clear()
+        counts = {}
+        for url in urls:
+            with budget() as counted:
+                fetch(client, 'get', url, None)
+            counts[url] = len(counted.statements)
+        return counts
+
+    before = count_queries()
+    with app.app_context():
+        seed(*[db.session.query(db.func.count(model.id)).scalar()
+               for model in (Venue, Artist)])
+        db.session.remove()
+    assert count_queries() == before
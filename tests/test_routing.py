@@ -0,0 +1,64 @@
+import itertools
+import time
+
+import pytest
+
+import app as fyyur
+from models import db
+from test_query_budgets import VENUE_FORM
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    # a second SQLite file as the one replica, with the schema but none of
+    # the primary's rows, like a replica that has not caught up yet
+    router = db.router
+    app.config['SQLALCHEMY_BINDS'] = dict(
+        app.config['SQLALCHEMY_BINDS'] or {},
+        replica0='sqlite:///{}'.format(tmp_path / 'replica.db'))
+    with app.app_context():
+        engine = db.get_engine(app, bind='replica0')
+        db.Model.metadata.create_all(bind=engine)
+    router.bind_keys = ['replica0']
+    # no write from an earlier test counts as recent
+    router.last_write = 0.0
+    router._cycle = itertools.cycle(router.bind_keys)
+    fyyur.search_cache.clear()
+    yield engine
+    router.bind_keys = []
+    router._cycle = itertools.cycle(router.bind_keys)
+    fyyur.search_cache.clear()
+    engine.dispose()
+
+
+def names(response):
+    return [row['name'] for row in response.get_json()['data']]
+
+
+def test_writer_reads_own_write_and_others_read_replica(app, replica):
+    writer = app.test_client()
+    reader = app.test_client()
+    venue = dict(VENUE_FORM, name='Replica Lag Hall')
+    # cached from the replica before anyone wrote
+    assert names(reader.get('/api/search?q=Lag Hall')) == []
+
+    response = writer.post('/venues/create', data=venue)
+    assert response.status_code == 200
+
+    # the writer is sticky to the primary and skips the cache
+    assert names(writer.get('/api/search?q=Lag Hall')) == [venue['name']]
+    # everyone else reads the lagging replica, whose result is not cached
+    assert names(reader.get('/api/search?q=Replica Lag')) == []
+    assert fyyur.search_cache.get(('venue', 'replica lag')) is None
+    assert names(writer.get('/api/search?q=Replica Lag')) == [venue['name']]
+
+
+def test_replica_reads_are_cached_only_for_the_sticky_window(app, replica, monkeypatch):
+    # another process's write leaves no trace here, so whatever a replica
+    # returned may be behind it for up to the sticky window
+    monkeypatch.setattr(db.router, 'sticky_seconds', 0.05)
+    reader = app.test_client()
+    assert names(reader.get('/api/search?q=Sticky Window')) == []
+    assert fyyur.search_cache.get(('venue', 'sticky window')) is not None
+    time.sleep(0.1)
+    assert fyyur.search_cache.get(('venue', 'sticky window')) is None